@@ -1,8 +1,15 @@
-from util import ContentGen
+from util import ContentGen, CounterContentGen, NumpyContentGen
+from database.cache import SchemaCache
+from database.checkpoint import Checkpoint
 from abc import ABCMeta, abstractmethod
 from common import version
+from collections import deque
+from datetime import datetime
 from os import linesep
+import json
+import signal
 import sys
+import time
 import argparse
 
 
@@ -49,6 +56,123 @@ class LoremDb(object):
             "-n", "--number", default=100, type=int,
             dest="number", help="Number of registers to fill")
 
+        self._parser.add_argument(
+            "--rows", dest="rows", nargs="+", metavar="TABLE=ROWS",
+            help=("Number of registers of specific tables (others "
+                  "get '-n'); Separate tables with spaces ' '"))
+
+        self._parser.add_argument(
+            "--manifest", dest="manifest", metavar="PATH",
+            help=("JSON file with the number of registers of specific "
+                  "tables ('--rows' overrides it) and the bounds of their "
+                  "date columns, e.g. {\"users\": 1000, \"orders\": "
+                  "{\"rows\": 500, \"columns\": {\"created\": "
+                  "{\"start\": \"2015-01-01\", \"end\": "
+                  "\"2016-12-31 23:59:59\"}}}}"))
+
+        self._parser.add_argument(
+            "--top-up", action="store_true", dest="top_up",
+            help=("Only insert the registers tables lack to reach their "
+                  "number (counts are estimated from table statistics "
+                  "in MySQL and from the greatest rowid in SQLite)"))
+
+        self._parser.add_argument(
+            "--batch-size", default=1, type=int, dest="batch_size",
+            help=("Number of registers sent to the database "
+                  "in each insert call"))
+
+        self._parser.add_argument(
+            "--strategy", default="insert", dest="strategy",
+            choices=["insert", "load-data"],
+            help=("How registers are sent to the database; "
+                  "'load-data' uses LOAD DATA LOCAL INFILE (MySQL only)"))
+
+        self._parser.add_argument(
+            "--prepared", action="store_true", dest="prepared",
+            help=("Send inserts as server-side prepared statements, "
+                  "prepared once per table and batch size (MySQL only)"))
+
+        self._parser.add_argument(
+            "--bulk-session", action="store_true", dest="bulk_session",
+            help=("Fill without foreign key and unique checks nor binary "
+                  "log, with keys disabled when the engine allows it, "
+                  "then rebuild them and ANALYZE the tables (MySQL only)"))
+
+        self._parser.add_argument(
+            "--commit-every", type=int, dest="commit_every",
+            help="Commit each time this number of registers is inserted")
+
+        self._parser.add_argument(
+            "--commit-per-table", action="store_true",
+            dest="commit_per_table", help="Commit after filling each table")
+
+        self._parser.add_argument(
+            "-j", "--jobs", default=1, type=int, dest="jobs",
+            help="Number of tables filled concurrently")
+
+        self._parser.add_argument(
+            "--shards", default=1, type=int, dest="shards",
+            help="Number of processes filling each table")
+
+        self._parser.add_argument(
+            "--queue-depth", type=int, dest="queue_depth", metavar="BLOCKS",
+            help=("Generate registers in another thread while inserting, "
+                  "up to this number of blocks of registers ahead"))
+
+        self._parser.add_argument(
+            "--numpy", action="store_true", dest="numpy",
+            help="Generate values in batches with NumPy (if installed)")
+
+        self._parser.add_argument(
+            "--seed", type=int, dest="seed",
+            help=("Generate each value from this seed and its table, row "
+                  "and column, so every fill (sharded, parallel or not) "
+                  "produces the same registers"))
+
+        self._parser.add_argument(
+            "--fast", action="store_true", dest="fast",
+            help=("Fill in a single transaction with relaxed "
+                  "journal and sync settings (SQLite only)"))
+
+        self._parser.add_argument(
+            "--rebuild-indexes", action="store_true", dest="rebuild_indexes",
+            help=("Drop the tables' indexes (but unique ones) before "
+                  "filling, then create them again and ANALYZE the "
+                  "tables (SQLite only)"))
+
+        self._parser.add_argument(
+            "--max-error-ratio", type=float, dest="max_error_ratio",
+            metavar="RATIO",
+            help=("Stop filling a table when this ratio (0 to 1) of the "
+                  "last '--error-window' registers fail"))
+
+        self._parser.add_argument(
+            "--error-window", default=1000, type=int, dest="error_window",
+            metavar="ROWS",
+            help="Number of registers checked by '--max-error-ratio'")
+
+        self._parser.add_argument(
+            "--breaker-action", default="abandon", dest="breaker_action",
+            choices=["abandon", "defer"],
+            help=("What is done with a table stopped by "
+                  "'--max-error-ratio'; 'defer' fills it again after "
+                  "the other tables"))
+
+        self._parser.add_argument(
+            "--schema-cache", dest="schema_cache", metavar="PATH",
+            help=("File where the tables' schema is kept between runs; "
+                  "tables are only inspected again if changed"))
+
+        self._parser.add_argument(
+            "--checkpoint", dest="checkpoint", metavar="PATH",
+            help=("File where the registers committed of each table are "
+                  "saved, so an interrupted fill can be resumed"))
+
+        self._parser.add_argument(
+            "--resume", action="store_true", dest="resume",
+            help=("Continue the fill saved in '--checkpoint' (with its "
+                  "seed, if any)"))
+
         self._parser.add_argument(
             "--version", action="version", version="%(prog)s "+version)
 
@@ -75,17 +199,164 @@ class LoremDb(object):
         if self.options.dbms is None:
             raise ArgumentError("Parameter '-d' (DBMS) is required.")
 
+        if self.options.numpy:
+            try:
+                import numpy
+            except ImportError:
+                raise ArgumentError(
+                    "Parameter '--numpy' requires NumPy to be installed.")
+
+        if self.options.numpy and self.options.seed is not None:
+            raise ArgumentError(
+                "Parameters '--numpy' and '--seed' can't be used together.")
+
+        if self.options.batch_size < 1:
+            raise ArgumentError("Parameter '--batch-size' must be >= 1.")
+
+        if self.options.jobs < 1:
+            raise ArgumentError("Parameter '-j|--jobs' must be >= 1.")
+
+        if self.options.shards < 1:
+            raise ArgumentError("Parameter '--shards' must be >= 1.")
+
+        if self.options.queue_depth is not None \
+                and self.options.queue_depth < 1:
+            raise ArgumentError("Parameter '--queue-depth' must be >= 1.")
+
+        if self.options.commit_every is not None \
+                and self.options.commit_every < 1:
+            raise ArgumentError("Parameter '--commit-every' must be >= 1.")
+
+        if self.options.max_error_ratio is not None \
+                and not 0 < self.options.max_error_ratio <= 1:
+            raise ArgumentError(
+                "Parameter '--max-error-ratio' must be > 0 and <= 1.")
+
+        if self.options.error_window < 1:
+            raise ArgumentError("Parameter '--error-window' must be >= 1.")
+
+        if self.options.resume and self.options.checkpoint is None:
+            raise ArgumentError(
+                "Parameter '--resume' requires '--checkpoint'.")
+
+        # Ranges of shards are committed out of order, so the rows
+        # committed aren't a prefix of the table
+        if self.options.checkpoint is not None and self.options.shards > 1:
+            raise ArgumentError(
+                "Parameters '--checkpoint' and '--shards' can't be used "
+                "together.")
+
+        if self.options.number < 0:
+            raise ArgumentError("Parameter '-n|--number' must be >= 0.")
+
+        manifest = self._read_manifest()
+        self.options.row_targets = self._get_row_targets(manifest)
+        self.options.column_options = self._get_column_options(manifest)
+
+    def _read_manifest(self):
+        """
+        Returns the tables of '--manifest' (empty without it)
+        """
+        if self.options.manifest is None:
+            return {}
+
+        try:
+            with open(self.options.manifest) as f:
+                manifest = json.load(f)
+        except (IOError, ValueError), e:
+            raise ArgumentError("Invalid manifest: {0}".format(e))
+
+        if not isinstance(manifest, dict):
+            raise ArgumentError(
+                "Invalid manifest: tables and rows are expected.")
+
+        return manifest
+
+    def _get_row_targets(self, manifest):
+        """
+        Returns the number of rows of each table given with '--manifest'
+        and '--rows'
+        """
+        targets = {}
+        for name, value in manifest.items():
+            # Tables with columns have their rows (if any) in "rows"
+            if not isinstance(value, dict):
+                targets[name] = value
+            elif "rows" in value:
+                targets[name] = value["rows"]
+
+        for item in self.options.rows or []:
+            name, _, rows = item.partition("=")
+            targets[name] = rows
+
+        for name, rows in targets.items():
+            if isinstance(rows, basestring) and rows.isdigit():
+                rows = int(rows)
+
+            if isinstance(rows, bool) or not isinstance(rows, (int, long)) \
+                    or rows < 0:
+                raise ArgumentError(
+                    "Invalid number of registers of '{0}': {1}".format(
+                        name, rows))
+
+            targets[name] = rows
+
+        return targets
+
+    def _get_column_options(self, manifest):
+        """
+        Returns the options of columns given with '--manifest' by table,
+        e.g. {"orders": {"created": {"start": datetime(2015, 1, 1)}}}
+        """
+        options = {}
+        for name, value in manifest.items():
+            if not isinstance(value, dict):
+                continue
+
+            columns = value.get("columns", {})
+            if not isinstance(columns, dict):
+                raise ArgumentError(
+                    "Invalid columns of '{0}': {1}".format(name, columns))
+
+            for column, bounds in columns.items():
+                if not isinstance(bounds, dict) \
+                        or len(set(bounds) - set(["start", "end"])) > 0:
+                    raise ArgumentError(
+                        "Invalid options of '{0}.{1}': {2}".format(
+                            name, column, bounds))
+
+                options.setdefault(name, {})[column] = dict([
+                    (key, self._parse_bound(name, column, bound))
+                    for key, bound in bounds.items()
+                ])
+
+        return options
+
+    def _parse_bound(self, name, column, value):
+        for date_format in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]:
+            try:
+                return datetime.strptime(value, date_format)
+            except (TypeError, ValueError):
+                pass
+
+        raise ArgumentError(
+            "Invalid date of '{0}.{1}': {2}".format(name, column, value))
+
 
 class DbmsHandle(object):
     __metaclass__ = ABCMeta
 
     def __init__(self, args):
         self.options = args
-        self.output_progress = OutputProgress(args.number, sys.stdout.write)
+        self.progress = ProgressRenderer(args.number, sys.stdout)
         self.counters = {
             "inserts": 0,
             "insert_errors": 0,
         }
+        self.errors_by_cause = {}
+        self.abandoned_tables = []
+        self.checkpoint = None
+        self._database = None
 
     def execute(self):
         """
@@ -107,44 +378,170 @@ class DbmsHandle(object):
         """
         Execute the program
         """
+        if self.options.checkpoint is not None:
+            self.checkpoint = self._create_checkpoint()
+
         db = self._create_database()
+        self._database = db
 
         # Adding main 'slots'
         db.on_change_table.register(self._current_table_changed)
-        db.on_insert.register(self._insert_received)
+        db.on_rows_inserted.register(self._rows_inserted_received)
         db.on_insert_error.register(self._insert_error_received)
+        db.on_commit.register(self._commit_received)
+        db.on_table_abandoned.register(self._table_abandoned_received)
+        db.on_table_finished.register(self._table_finished_received)
+        db.on_pipeline_stats.register(self._pipeline_stats_received)
 
         if self.options.filter is not None:
             db.filter(*self.options.filter)
 
-        db.fill(self.options.number)
+        if self.options.schema_cache is not None:
+            db.schema_cache = SchemaCache(self.options.schema_cache)
+
+        db.checkpoint = self.checkpoint
+        db.row_targets = self.options.row_targets
+        db.column_options = self.options.column_options
+
+        unknown = db.get_unknown_tables(
+            self.options.row_targets.keys()
+            + self.options.column_options.keys())
+        if len(unknown) > 0:
+            raise ArgumentError(
+                "Unexpected tables in '--rows|--manifest': "
+                + ", ".join(unknown))
+        db.top_up = self.options.top_up
+
+        # The first Ctrl-C stops the fill after the current batches
+        previous_handler = signal.signal(
+            signal.SIGINT, self._interrupt_received)
+        try:
+            self._fill(db)
+        finally:
+            signal.signal(signal.SIGINT, previous_handler)
+
+    def _fill(self, db):
+        db.fill(
+            self.options.number,
+            batch_size=self.options.batch_size,
+            commit_every=self.options.commit_every,
+            commit_per_table=self.options.commit_per_table,
+            jobs=self.options.jobs,
+            shards=self.options.shards,
+            max_error_ratio=self.options.max_error_ratio,
+            error_window=self.options.error_window,
+            breaker_action=self.options.breaker_action,
+            queue_depth=self.options.queue_depth
+        )
+
+    def _create_checkpoint(self):
+        checkpoint = Checkpoint(self.options.checkpoint, self.options.seed)
+        if not self.options.resume:
+            return checkpoint
+
+        try:
+            checkpoint.load()
+        except (IOError, ValueError), e:
+            raise ArgumentError("Can't resume: {0}".format(e))
+
+        # Rows are continued with the seed they were generated with
+        if self.options.seed is None:
+            self.options.seed = checkpoint.seed
+        elif checkpoint.seed != self.options.seed:
+            raise ArgumentError(
+                "Parameter '--seed' differs from the checkpoint's seed "
+                "({0}).".format(checkpoint.seed))
+
+        return checkpoint
+
+    def _interrupt_received(self, signum, frame):
+        self.progress.log("Interrupted, stopping after the current batch "
+                          "(Ctrl-C again to abort)")
+
+        # A second Ctrl-C raises KeyboardInterrupt
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        self._database.stop()
 
     def _current_table_changed(self, table_info):
-        print ""
-        print "Populating '{}'".format(table_info["name"])
-        self.output_progress.reset()
+        self.progress.start_table(
+            table_info, table_info.get("start", 0),
+            self._database.get_target_rows(
+                table_info["name"], self.options.number))
 
-    def _insert_received(self):
-        self.output_progress()
-        sys.stdout.flush()
-        self.counters["inserts"] += 1
+    def _rows_inserted_received(self, table_info, count, errors):
+        self.progress.update(table_info, count, errors)
+        self.counters["inserts"] += count
+        self.counters["insert_errors"] += errors
 
     def _insert_error_received(self, e):
-        self.counters["insert_errors"] += 1
+        cause = self._database.classify_error(e)
+        self.errors_by_cause[cause] = self.errors_by_cause.get(cause, 0) + 1
+
+    def _table_abandoned_received(self, table_info, rows, deferred):
+        action = "deferred" if deferred else "abandoned"
+        self.progress.log("'{}': {} after {} registers (too many errors)"
+                          .format(table_info["name"], action, rows))
+
+        if not deferred:
+            self.abandoned_tables.append(table_info["name"])
+
+    def _table_finished_received(self, table_info, rows):
+        self.progress.finish_table(table_info)
+
+    def _pipeline_stats_received(self, table_info, producer_wait,
+                                 consumer_wait):
+        # The side that waited less kept the other one waiting
+        bottleneck = "generation"
+        if producer_wait > consumer_wait:
+            bottleneck = "inserts"
+
+        self.progress.log(
+            ("'{}': generation waited {:.2f}s for inserts, inserts waited "
+             "{:.2f}s for generation ({} is the bottleneck)").format(
+                table_info["name"], producer_wait, consumer_wait,
+                bottleneck))
+
+    def _commit_received(self, table_info, rows):
+        self.progress.log("'{}': commit: {} registers".format(
+            table_info["name"], rows))
 
     def _show_ending(self):
+        interrupted = self._database is not None \
+            and self._database.interrupted
+
         print ""
-        print "... Finished"
+        print "... Interrupted" if interrupted else "... Finished"
         print ""
         print "------------------------------------"
         print "Inserts: {}".format(self.counters["inserts"])
         print "Inserts with error: {}".format(self.counters["insert_errors"])
+        for cause, errors in sorted(self.errors_by_cause.items()):
+            print "  {}: {}".format(cause, errors)
+
         print "Inserts with success: {}".format(
             self.counters["inserts"] - self.counters["insert_errors"]
         )
+
+        if len(self.abandoned_tables) > 0:
+            print "Abandoned tables: {}".format(
+                ", ".join(self.abandoned_tables))
+
+        if interrupted and self.checkpoint is not None:
+            print "Resume with: --checkpoint {} --resume".format(
+                self.checkpoint.path)
+
         print "------------------------------------"
         print ""
 
+    def _create_content_gen(self):
+        if self.options.seed is not None:
+            return CounterContentGen(seed=self.options.seed)
+
+        if self.options.numpy:
+            return NumpyContentGen()
+
+        return ContentGen()
+
     @abstractmethod
     def _validate_args(self):
         """
@@ -169,6 +566,17 @@ class MysqlDbmsHandle(DbmsHandle):
         if self.options.user is None:
             raise ArgumentError("Parameter '-u|--user' (User) is required.")
 
+        if self.options.fast:
+            raise ArgumentError("Parameter '--fast' isn't supported by MySQL.")
+
+        if self.options.rebuild_indexes:
+            raise ArgumentError(
+                "Parameter '--rebuild-indexes' isn't supported by MySQL.")
+
+        if self.options.prepared and self.options.strategy != "insert":
+            raise ArgumentError(
+                "Parameter '--prepared' requires the 'insert' strategy.")
+
     def _create_database(self):
         params = {
             "user": self.options.user,
@@ -176,7 +584,10 @@ class MysqlDbmsHandle(DbmsHandle):
             "database": self.options.database,
             "host": self.options.host,
             "port": self.options.port,
-            "content_gen": ContentGen()
+            "strategy": self.options.strategy,
+            "prepared": self.options.prepared,
+            "bulk_session": self.options.bulk_session,
+            "content_gen": self._create_content_gen()
         }
 
         # Remove None values
@@ -192,73 +603,174 @@ class SqliteDbmsHandle(DbmsHandle):
         if self.options.database is None:
             raise ArgumentError("Parameter '--db' (Database) is required.")
 
+        if self.options.strategy != "insert":
+            raise ArgumentError(
+                "Strategy '{0}' isn't supported by SQLite.".format(
+                    self.options.strategy))
+
+        # Only one connection can write in a SQLite database at a time
+        if self.options.jobs > 1:
+            raise ArgumentError(
+                "Parameter '-j|--jobs' isn't supported by SQLite.")
+
+        if self.options.shards > 1:
+            raise ArgumentError(
+                "Parameter '--shards' isn't supported by SQLite.")
+
+        if self.options.prepared:
+            raise ArgumentError(
+                "Parameter '--prepared' isn't supported by SQLite.")
+
+        if self.options.bulk_session:
+            raise ArgumentError(
+                "Parameter '--bulk-session' isn't supported by SQLite.")
+
     def _create_database(self):
         from database import sqlite
         return sqlite.DataBase(
-            content_gen=ContentGen(),
-            name=self.options.database)
+            content_gen=self._create_content_gen(),
+            name=self.options.database,
+            fast=self.options.fast,
+            rebuild_indexes=self.options.rebuild_indexes)
 
 
-class OutputProgress(object):
+class ProgressRenderer(object):
     """
-    Show progress acording with a size (param progress_size)
+    Show the progress of filling tables with 'total' rows each (unless
+    other total is given to start_table()).
     Ex:
-    o = OutputProgress(100, sys.stdout.write) # All dots will be
-    # written in the screen.
-
-    o() # This will print (using sys.stdout.write) a dots
-    # quantity related with 100.
-
-    # OBS: Raise an StandardError if number of calls exceed
-    # progress_size parameter.
+    p = ProgressRenderer(1000, sys.stdout)
+    p.start_table(table_info)
+    p.update(table_info, 100, 2) # 100 rows inserted, 2 with error.
+    p.log("Some message")
+    p.finish_table(table_info)
+
+    The status line is redrawn at most every 'interval' seconds with
+    current and average rows/s, ETA, error rate and elapsed time of the
+    table. If the stream isn't a TTY a log line is written every
+    'log_interval' seconds instead. finish_table() writes a line with
+    the table's summary, also for tables stopped before their total
+    (abandoned or interrupted).
     """
 
-    line_size = 50
-    lines = 10
-
-    # Number of calls and actual dots, respectively.
-    _calls_counter = 0
-    _actual_dots = 0
-
-    def __init__(self, progress_size, callback):
-        self.progress_size = progress_size
-        self._callback = callback
-
-    def reset(self):
-        self._calls_counter = 0
-        self._actual_dots = 0
-
-    def __call__(self):
-        # The number of calls does'n exceed progres_size
-        if self._calls_counter + 1 > self.progress_size:
-            raise StandardError("Number of calls exhausted")
+    interval = 0.25
+    log_interval = 10
 
-        self._calls_counter += 1
-        self._print_dots()
+    # Seconds used to calc the current rate
+    rate_window = 2
 
-    def _print_dots(self):
-        total_dots = self.line_size * self.lines
-        new_dots = int(self._calls_counter * total_dots / self.progress_size)
+    def __init__(self, total, stream, clock=time.time, tty=None):
+        self.total = total
+        self._stream = stream
+        self._clock = clock
 
-        self._call_callback(new_dots - self._actual_dots)
+        if tty is None:
+            tty = getattr(stream, "isatty", lambda: False)()
 
-        self._actual_dots = new_dots
+        self._tty = tty
+        self._tables = {}
+        self._last_draw = None
+        self._line_len = 0
 
-    def _call_callback(self, diff):
-        old_line = int(self._actual_dots / self.line_size)
-
-        for c in range(1, diff+1):
-            self._callback(".")
-
-            # Show percent
-            act_line = int((self._actual_dots + c) / self.line_size)
-            if act_line > old_line:
-                self._show_percent(self._actual_dots + c)
-                old_line = act_line
-
-    def _show_percent(self, dots):
-        self._callback(
-            " %.0f%%" % (float(dots) / (self.line_size * self.lines) * 100)
-        )
-
-        self._callback(linesep)
+    def start_table(self, table_info, rows=0, total=None):
+        """
+        Starts showing the progress of a table, with 'rows' already
+        filled (e.g. by a resumed fill) of 'total' rows (if not the
+        default one)
+        """
+        now = self._clock()
+        self._tables[table_info["name"]] = {
+            "total": total if total is not None else self.total,
+            "start": now,
+            "rows": rows,
+            "resumed_rows": rows,
+            "errors": 0,
+            "samples": deque([(now, rows)]),
+        }
+        self.log("Populating '{}'".format(table_info["name"]))
+
+    def update(self, table_info, count, errors=0):
+        now = self._clock()
+        state = self._tables[table_info["name"]]
+        state["rows"] += count
+        state["errors"] += errors
+
+        samples = state["samples"]
+        samples.append((now, state["rows"]))
+        while len(samples) > 2 and now - samples[1][0] >= self.rate_window:
+            samples.popleft()
+
+        # The summary is written by finish_table()
+        if state["rows"] >= state["total"]:
+            return
+
+        interval = self.interval if self._tty else self.log_interval
+        if self._last_draw is not None and now - self._last_draw < interval:
+            return
+
+        self._last_draw = now
+        line = self._format(table_info["name"], now)
+        if self._tty:
+            self._draw(line)
+        else:
+            self._write_line(line)
+
+    def finish_table(self, table_info):
+        self._write_line(
+            self._format(table_info["name"], self._clock(), True))
+
+    def log(self, message):
+        self._write_line(message)
+
+    def _format(self, name, now, finished=False):
+        state = self._tables[name]
+        rows = state["rows"]
+        total = state["total"]
+        elapsed = now - state["start"]
+
+        # Rows filled before (see start_table()) aren't counted in rates
+        new_rows = rows - state["resumed_rows"]
+        average = float(new_rows) / elapsed if elapsed > 0 else 0.0
+
+        errors = ""
+        if new_rows > 0:
+            errors = ", {0:.1f}% errors".format(
+                100.0 * state["errors"] / new_rows)
+
+        if finished:
+            return "'{0}': {1} rows in {2}, {3:.0f} rows/s{4}".format(
+                name, rows, self._format_time(elapsed), average, errors)
+
+        first_time, first_rows = state["samples"][0]
+        current = average
+        if now > first_time:
+            current = float(rows - first_rows) / (now - first_time)
+
+        eta = "?"
+        if current > 0:
+            eta = self._format_time((total - rows) / current)
+
+        return ("'{0}': {1}/{2} ({3:.0f}%), {4:.0f} rows/s"
+                " (avg {5:.0f}), ETA {6}{7}, elapsed {8}").format(
+            name, rows, total, 100.0 * rows / max(total, 1), current,
+            average, eta, errors, self._format_time(elapsed))
+
+    def _format_time(self, seconds):
+        seconds = int(seconds)
+        return "{0}:{1:02d}:{2:02d}".format(
+            seconds / 3600, seconds / 60 % 60, seconds % 60)
+
+    def _draw(self, line):
+        # Spaces clear what remains of the previous line
+        padding = " " * max(self._line_len - len(line), 0)
+        self._stream.write("\r" + line + padding)
+        self._stream.flush()
+        self._line_len = len(line)
+
+    def _write_line(self, line):
+        if self._line_len > 0:
+            self._stream.write("\r" + " " * self._line_len + "\r")
+            self._line_len = 0
+
+        self._stream.write(line + linesep)
+        self._stream.flush()
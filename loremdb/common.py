@@ -42,6 +42,12 @@ class Signal(object):
         for key, func in self._slots.iteritems():
             func.im_func(func.im_self, *args, **kwargs)
 
+    def __len__(self):
+        """
+        Number of registered slots
+        """
+        return len(self._slots)
+
     def register(self, slot):
         self._slots[self._get_key(slot)] = slot
 
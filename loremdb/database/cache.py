@@ -0,0 +1,98 @@
+import cPickle as pickle
+import os
+import threading
+
+
+class SchemaCache(object):
+    """
+    Fields of tables saved in a file between runs.
+    Each entry is kept with the fingerprint of the table's schema
+    (see DataBase.get_schema_fingerprint()) and it's discarded
+    when the fingerprint changes.
+    Ex:
+    cache = SchemaCache("/tmp/loremdb.cache")
+    fields = cache.get(key, fingerprint) # None if missing or outdated
+    cache.set(key, fingerprint, fields)
+    cache.save()
+    """
+
+    # Entries of files saved with other versions are discarded
+    version = 1
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+        self._changed = False
+        self._lock = threading.Lock()
+
+    def get(self, key, fingerprint):
+        with self._lock:
+            entry = self._get_entries().get(key)
+
+        if entry is None or entry[0] != fingerprint:
+            return None
+
+        # Each call returns its own objects
+        return pickle.loads(entry[1])
+
+    def contains(self, key, fingerprint):
+        """
+        Returns if there's an entry of 'key' with 'fingerprint' (without
+        loading its value)
+        """
+        with self._lock:
+            entry = self._get_entries().get(key)
+
+        return entry is not None and entry[0] == fingerprint
+
+    def set(self, key, fingerprint, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._get_entries()[key] = (fingerprint, data)
+            self._changed = True
+
+    def save(self):
+        """
+        Writes the entries in the file (if anything changed)
+        """
+        with self._lock:
+            if not self._changed:
+                return
+
+            # The file is replaced at once, so a broken write doesn't
+            # leave a broken cache
+            tmp_path = "{0}.{1}.tmp".format(self.path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                pickle.dump(
+                    {"version": self.version, "entries": self._entries},
+                    f, pickle.HIGHEST_PROTOCOL)
+
+            os.rename(tmp_path, self.path)
+            self._changed = False
+
+    def _get_entries(self):
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        try:
+            with open(self.path, "rb") as f:
+                content = pickle.load(f)
+        except Exception:
+            # A missing or unreadable file is an empty cache
+            return self._entries
+
+        if isinstance(content, dict) \
+                and content.get("version") == self.version:
+            self._entries = content["entries"]
+
+        return self._entries
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
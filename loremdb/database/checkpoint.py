@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+
+
+class Checkpoint(object):
+    """
+    Rows of each table committed by a fill, saved in a JSON file so
+    an interrupted fill can be resumed (see DataBase.fill()).
+    With a 'seed' (see CounterContentGen), the rows of a resumed fill
+    are the ones the interrupted fill would have generated.
+    Ex:
+    checkpoint = Checkpoint("/tmp/loremdb.checkpoint", seed=42)
+    checkpoint.load() # values of the interrupted fill
+    checkpoint.get_rows("users") # rows committed so far
+    checkpoint.set_rows("users", 1000)
+    checkpoint.save()
+    """
+
+    # Files saved with other versions can't be resumed
+    version = 1
+
+    def __init__(self, path, seed=None):
+        self.path = path
+        self.seed = seed
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Reads the saved values, raises ValueError if the file isn't
+        a checkpoint (IOError if it can't be read).
+        """
+        with open(self.path, "rb") as f:
+            try:
+                content = json.load(f)
+            except ValueError:
+                raise ValueError("Invalid checkpoint: " + self.path)
+
+        if not isinstance(content, dict) \
+                or content.get("version") != self.version:
+            raise ValueError("Invalid checkpoint: " + self.path)
+
+        with self._lock:
+            self.seed = content.get("seed")
+            self._tables = dict(content.get("tables", {}))
+
+    def get_rows(self, name):
+        with self._lock:
+            return self._tables.get(name, 0)
+
+    def set_rows(self, name, rows):
+        with self._lock:
+            self._tables[name] = rows
+
+    def save(self):
+        with self._lock:
+            content = {
+                "version": self.version,
+                "seed": self.seed,
+                "tables": self._tables,
+            }
+
+            # The file is replaced at once, so an interrupted write
+            # doesn't leave a broken checkpoint
+            tmp_path = "{0}.{1}.tmp".format(self.path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                json.dump(content, f, indent=2, sort_keys=True)
+
+            os.rename(tmp_path, self.path)
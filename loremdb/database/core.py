@@ -2,6 +2,75 @@ import random
 from loremdb.util import ContentGen
 from loremdb.common import Signal
 from abc import ABCMeta, abstractmethod
+from array import array
+from collections import deque, namedtuple
+from itertools import islice
+import multiprocessing
+import Queue
+import signal
+import sys
+import threading
+import time
+
+
+class InsertError(Exception):
+    """
+    Error of an insert made in another process (see Table.fill()).
+    'errno' is the driver's error code, if any.
+    """
+
+    def __init__(self, message, errno=None):
+        super(InsertError, self).__init__(message)
+        self.errno = errno
+
+    def __reduce__(self):
+        return (self.__class__, (str(self), self.errno))
+
+
+# Columns of a table referencing columns of a 'parent' table
+ForeignKey = namedtuple("ForeignKey", "columns parent parent_columns")
+
+
+class KeyPool(object):
+    """
+    Keys (values of one or more columns) of a table, used to sample
+    values of foreign keys referencing it.
+    Each column is kept in an array of integers, or in a list if any
+    value isn't an integer, so big tables take little memory.
+    """
+
+    def __init__(self, columns_num):
+        self._columns = [array("l") for i in xrange(columns_num)]
+
+    def __len__(self):
+        return len(self._columns[0])
+
+    def add(self, key):
+        if None in key:
+            return
+
+        for i, value in enumerate(key):
+            try:
+                self._columns[i].append(value)
+            except (TypeError, OverflowError):
+                self._columns[i] = list(self._columns[i])
+                self._columns[i].append(value)
+
+    def get(self, index):
+        return tuple([column[index] for column in self._columns])
+
+    def sample(self, content_gen):
+        """
+        Returns a random key
+        """
+        return self.get(content_gen.get_int(0, len(self) - 1))
+
+    def samples(self, content_gen, n):
+        """
+        Returns 'n' random keys as a list of values for each column
+        """
+        indexes = content_gen.get_ints(0, len(self) - 1, n)
+        return [[column[i] for i in indexes] for column in self._columns]
 
 
 class Table(object):
@@ -12,17 +81,48 @@ class Table(object):
 
     on_insert:
         Signal on insert an item in the table (with error or not).
+        It's emitted for each row, prefer on_rows_inserted.
         Usage:
         table_object.on_insert.register(self._callback_method)
 
+    on_rows_inserted:
+        Signal emitted every 'progress_rows' rows or 'progress_interval'
+        seconds (and at the end of a fill), it receives the table info,
+        the number of rows processed (with error or not) and the number
+        of errors since the last emission.
+        Usage:
+        table_object.on_rows_inserted.register(self._callback_method)
+
     on_insert_error:
         Signal when an error happens on insert.
         Usage:
         table_object.on_insert_error.register(self._callback_method)
+
+    on_commit:
+        Signal when inserted rows are committed, it receives
+        the table info and the number of rows processed so far.
+        Usage:
+        table_object.on_commit.register(self._callback_method)
+
+    on_pipeline_stats:
+        Signal emitted at the end of a fill with 'queue_depth', it
+        receives the table info, the seconds rows waited for the writer
+        (the queue was full) and the seconds the writer waited for rows
+        (the queue was empty), see fill().
+        Usage:
+        table_object.on_pipeline_stats.register(self._callback_method)
     """
 
     __metaclass__ = ABCMeta
 
+    # With a seeded content generator, each block of rows is generated
+    # with its own derived generator (see _generate_rows())
+    block_size = 1000
+
+    # Limits of rows and seconds between on_rows_inserted emissions
+    progress_rows = 1000
+    progress_interval = 0.2
+
     def __init__(self, database, name, content_gen):
         self.name = name
         self._database = database
@@ -32,24 +132,440 @@ class Table(object):
         # Signal on insert an item (with error or not)
         self.on_insert = Signal()
 
+        # Signal with the number of rows inserted (and errors)
+        self.on_rows_inserted = Signal()
+
         # Signal when an error happens on insert
         self.on_insert_error = Signal()
 
-    def fill(self, n=10):
+        # Signal when inserted rows are committed
+        self.on_commit = Signal()
+
+        # Signal with the waits of a pipelined fill
+        self.on_pipeline_stats = Signal()
+
+        # First row of the last fill and rows processed (with error
+        # or not) since it
+        self.start = 0
+        self.rows_done = 0
+        self.errors_done = 0
+        self._reset_progress()
+
+        # If the last fill was stopped by too many errors (see fill())
+        self.abandoned = False
+
+        # If the last fill was stopped by DataBase.stop()
+        self.interrupted = False
+
+        self._fields = None
+        self._key_samplers = None
+        self._row_plan = None
+        self._unique_starts = None
+
+        # Last block of a seeded fill, see _get_seeded_block()
+        self._seeded_block = None
+
+    def fill(self, n=10, batch_size=None, commit_every=None, shards=1,
+             max_error_ratio=None, error_window=1000, queue_depth=None,
+             start=0):
+        """
+        Inserts 'n' random rows, in batches of 'batch_size' rows.
+        With 'start', rows before it are skipped (e.g. to resume a fill,
+        see DataBase.fill()).
+        With 'commit_every', rows are committed each time that many rows
+        were processed (checked between batches).
+        With 'shards' > 1, rows are split in ranges filled by that number
+        of processes (see _fill_sharded()).
+        With 'max_error_ratio', the fill stops (and 'abandoned' is set)
+        when the ratio of failed rows among the last 'error_window' rows
+        reaches it.
+        With 'queue_depth', rows are generated by another thread while
+        they're inserted, up to that number of blocks (see block_size)
+        ahead of the inserts.
+        Unique keys get values after the ones already in the table
+        (see _get_row_plan()).
+        The fill stops after the current batch if the database is asked
+        to stop (and 'interrupted' is set), see DataBase.stop().
+        """
+        self._row_plan = None
+        self._unique_starts = None
+        self._seeded_block = None
+        self.abandoned = False
+        self.interrupted = False
+        self.start = start
+
+        breaker = (max_error_ratio, error_window)
+        if shards > 1 and n - start > self.block_size:
+            self._fill_sharded(n, shards, batch_size, commit_every, breaker,
+                               queue_depth, start)
+        else:
+            self._fill_range(start, n, batch_size, commit_every, breaker,
+                             queue_depth)
+
+    def _fill_range(self, start, stop, batch_size=None, commit_every=None,
+                    breaker=(None, None), queue_depth=None):
+        """
+        Inserts the rows from 'start' to 'stop' (not included)
+        'breaker' is a tuple (max_error_ratio, error_window), see fill().
+        """
+        max_error_ratio, error_window = breaker
+        window = None
+        if max_error_ratio is not None:
+            window = _ErrorWindow(error_window)
+
         c = self.get_cursor()
 
         sql = self._create_insert_sql()
-        for i in xrange(n):
-            try:
-                self.on_insert()
-                c.execute(sql, self._get_random_params())
-            except Exception, e:
-                self.on_insert_error(e)
-                if self.show_errors:
-                    print "Exception: {0}".format(e)
+        pipeline = None
+        if queue_depth is not None and queue_depth > 0:
+            pipeline = self._start_pipeline(start, stop, queue_depth)
+            rows = self._generate_rows(start, stop, pipeline)
+        else:
+            rows = self._generate_rows(start, stop)
+
+        n = stop - start
+
+        batched = batch_size is not None and batch_size > 1
+        step = batch_size if batched else 1
+        committed = 0
+        self.rows_done = 0
+        self.errors_done = 0
+        self._reset_progress()
+        try:
+            for i in xrange(0, n, step):
+                errors = self.errors_done
+                if batched:
+                    self._insert_batch(c, sql, islice(rows, step))
+                else:
+                    self._insert_row(c, sql, next(rows))
+
+                self.rows_done = min(i + step, n)
+                self._report_progress()
+
+                if commit_every is not None \
+                        and self.rows_done - committed >= commit_every:
+                    self.commit()
+                    committed = self.rows_done
+
+                if window is not None:
+                    window.record(
+                        self.rows_done - i, self.errors_done - errors)
+                    if window.get_ratio() >= max_error_ratio:
+                        self.abandoned = True
+                        break
+
+                if self._database.stop_requested:
+                    self.interrupted = True
+                    break
+        finally:
+            if pipeline is not None:
+                pipeline.close()
+
+        self._report_progress(True)
+        if pipeline is not None:
+            self.on_pipeline_stats(
+                self.table_info, pipeline.producer_wait,
+                pipeline.consumer_wait)
 
         c.close()
 
+    def _start_pipeline(self, start, stop, queue_depth):
+        """
+        Returns a _Pipeline generating the blocks of rows from 'start'
+        to 'stop' in another thread.
+        """
+        # Keys and starts of unique values are read with this thread's
+        # connection before generating rows
+        self._get_row_plan()
+
+        return _Pipeline(self._generate_blocks(start, stop), queue_depth)
+
+    def _fill_sharded(self, n, shards, batch_size, commit_every, breaker,
+                      queue_depth=None, start=0):
+        """
+        Splits rows (from 'start') in ranges filled by a pool of 'shards'
+        processes, each one with its own connection and content generator.
+        Ranges are aligned to blocks (see block_size), so with a seeded
+        content generator rows are the same as the ones of a serial fill.
+        If the database is asked to stop, ranges not finished are
+        stopped (their rows may be committed or not).
+        """
+        blocks = -(-(n - start) // self.block_size)
+        range_size = -(-blocks // (shards * 4)) * self.block_size
+
+        # Keys of parent tables are sent to the processes with the database
+        self._get_row_plan()
+
+        # Parent rows inserted by this connection must be committed, or
+        # the processes would wait for their locks
+        if len(self._get_key_samplers()) > 0:
+            self._database.commit()
+
+        tasks = [
+            (self.__class__, self._database, self.name,
+             self._content_gen.spawn(), max(first, start),
+             min(first + range_size, n), batch_size, commit_every, breaker,
+             self._get_unique_starts(), queue_depth)
+            for first in xrange(start - start % self.block_size, n,
+                                range_size)
+        ]
+
+        self.rows_done = 0
+        self._reset_progress()
+        pool = multiprocessing.Pool(shards, _ignore_interrupts)
+        try:
+            results = pool.imap_unordered(_fill_shard, tasks)
+            for rows, errors, abandoned in results:
+                if len(self.on_insert) > 0:
+                    for i in xrange(rows):
+                        self.on_insert()
+
+                for e in errors:
+                    self._insert_failed(e)
+
+                self.rows_done += rows
+                self._report_progress(True)
+
+                # Other shards are stopped (see finally)
+                if abandoned:
+                    self.abandoned = True
+                    break
+
+                if self._database.stop_requested:
+                    self.interrupted = True
+                    break
+
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def commit(self):
+        self._database.set_processed_rows(
+            self.name, self.start + self.rows_done)
+        self._database.commit()
+        self.on_commit(self.table_info, self.rows_done)
+
+    def _reset_progress(self):
+        self._reported_rows = 0
+        self._reported_time = time.time()
+        self._pending_errors = 0
+
+    def _report_progress(self, force=False):
+        """
+        Emits on_rows_inserted if enough rows or time passed since
+        the last emission (or if 'force').
+        """
+        count = self.rows_done - self._reported_rows
+        if count == 0 and self._pending_errors == 0:
+            return
+
+        now = time.time()
+        if not force and count < self.progress_rows \
+                and now - self._reported_time < self.progress_interval:
+            return
+
+        errors = self._pending_errors
+        self._reported_rows = self.rows_done
+        self._reported_time = now
+        self._pending_errors = 0
+        self.on_rows_inserted(self.table_info, count, errors)
+
+    def get_row(self, index):
+        """
+        Returns the random params of the row 'index' of a fill, which are
+        the same in every fill with a seeded content generator (e.g. to
+        inspect a row that failed).
+        """
+        for rows in self._generate_blocks(index, index + 1):
+            return rows[0]
+
+    def _generate_rows(self, start, stop, blocks=None):
+        """
+        Generator of the random params of rows from 'start' to 'stop'
+        (see _generate_blocks()), or of the rows in 'blocks'.
+        """
+        # Rows are signaled one by one only if someone is listening
+        on_insert = self.on_insert if len(self.on_insert) > 0 else None
+
+        if blocks is None:
+            blocks = self._generate_blocks(start, stop)
+
+        for rows in blocks:
+            for params in rows:
+                if on_insert is not None:
+                    on_insert()
+
+                yield params
+
+    def _generate_blocks(self, start, stop):
+        """
+        Generator of lists with the random params of rows from 'start'
+        to 'stop'.
+        With a seeded content generator, rows of each block are generated
+        by a generator derived from the table name and block number, so
+        any range of rows can be generated independently.
+        With a counter based one (see CounterContentGen), each value is
+        generated from its row and column (see _generate_cells()).
+        """
+        seeded = self._content_gen.seed is not None
+        counter_based = self._content_gen.counter_based
+        if seeded and counter_based:
+            content_gen = self._content_gen.derive(self.name)
+
+        i = start
+        while i < stop:
+            if seeded and counter_based:
+                count = min(self.block_size, stop - i)
+                rows = self._generate_block(content_gen, count, i)
+            elif seeded:
+                block, offset = divmod(i, self.block_size)
+                count = min(self.block_size - offset, stop - i)
+                rows = self._get_seeded_block(
+                    block, offset + count)[offset:offset + count]
+            else:
+                count = min(self.block_size, stop - i)
+                rows = self._generate_block(self._content_gen, count, i)
+
+            yield rows
+            i += count
+
+    def _get_seeded_block(self, block, n):
+        """
+        Returns the first 'n' rows (at least) of the block number 'block'
+        of a seeded fill.
+        Rows are generated one after another, so the first rows of a
+        block don't depend on how many are generated. Vectorized values
+        are drawn by column, so the whole block is generated (and kept
+        for the next rows of the block).
+        """
+        content_gen = self._content_gen.derive(self.name, block)
+        start = block * self.block_size
+        if not content_gen.vectorized:
+            return self._generate_block(content_gen, n, start)
+
+        if self._seeded_block is None or self._seeded_block[0] != block:
+            self._seeded_block = (block, self._generate_block(
+                content_gen, self.block_size, start))
+
+        return self._seeded_block[1]
+
+    def _generate_block(self, content_gen, n, start=0):
+        """
+        Returns a list with the random params of 'n' rows, the first one
+        is the row 'start' of the fill (see _get_row_plan()).
+        With a vectorized content generator values are generated
+        by column (see Field.get_random_values()).
+        """
+        samplers, uniques = self._get_row_plan()
+
+        if content_gen.vectorized:
+            planned = set([i for positions, _ in samplers + uniques
+                           for i in positions])
+
+            columns = []
+            for i, field in enumerate(self._get_fields()):
+                field.content_gen = content_gen
+                if i in planned:
+                    columns.append(None)
+                else:
+                    columns.append(field.get_random_values(n))
+
+            # Columns of a foreign key share the sampled parent keys
+            for positions, pool in samplers:
+                for i, values in zip(positions, pool.samples(content_gen, n)):
+                    columns[i] = values
+
+            for positions, get_unique in uniques:
+                keys = [get_unique(start + j) for j in xrange(n)]
+                for k, i in enumerate(positions):
+                    columns[i] = [key[k] for key in keys]
+
+            return zip(*columns)
+
+        if content_gen.counter_based:
+            rows = self._generate_cells(content_gen, n, start)
+        else:
+            generate = self._compile_row(content_gen)
+            rows = [generate() for i in xrange(n)]
+
+        for positions, get_unique in uniques:
+            for j, row in enumerate(rows):
+                for i, value in zip(positions, get_unique(start + j)):
+                    row[i] = value
+
+        return rows
+
+    def _generate_cells(self, content_gen, n, start):
+        """
+        Returns a list with the random params of 'n' rows (from the row
+        'start'), each value generated after moving 'content_gen' to its
+        row and column (see CounterContentGen.seek()), so values don't
+        depend on the other rows or columns.
+        Values of unique keys are left to _generate_block().
+        """
+        fields = self._get_fields()
+        samplers, uniques = self._get_row_plan()
+        planned = set([i for positions, _ in samplers + uniques
+                       for i in positions])
+
+        generators = [
+            (i, field.compile(content_gen))
+            for i, field in enumerate(fields) if i not in planned
+        ]
+
+        seek = content_gen.seek
+        rows = []
+        for index in xrange(start, start + n):
+            row = [None] * len(fields)
+            for i, generate in generators:
+                seek(index, i)
+                row[i] = generate()
+
+            for positions, pool in samplers:
+                seek(index, positions[0])
+                for i, value in zip(positions, pool.sample(content_gen)):
+                    row[i] = value
+
+            rows.append(row)
+
+        return rows
+
+    def _insert_row(self, cursor, sql, params):
+        """
+        Inserts a single row, returns False if it failed.
+        """
+        try:
+            cursor.execute(sql, params)
+        except Exception, e:
+            self._insert_failed(e)
+            return False
+
+        return True
+
+    def _insert_batch(self, cursor, sql, rows):
+        """
+        Inserts 'rows' (an iterable of params, it must be consumed
+        entirely) with a single executemany() call.
+        If the batch fails, rows are inserted again one by one, so
+        each failed row is reported through on_insert_error.
+        It expects the driver to insert the whole batch atomically,
+        backends without that guarantee must override it.
+        """
+        rows = list(rows)
+        try:
+            cursor.executemany(sql, rows)
+        except Exception:
+            for params in rows:
+                self._insert_row(cursor, sql, params)
+
+    def _insert_failed(self, e):
+        self.errors_done += 1
+        self._pending_errors += 1
+        self.on_insert_error(e)
+        if self.show_errors:
+            print "Exception: {0}".format(e)
+
     def get_cursor(self):
         return self._database.get_cursor()
 
@@ -65,29 +581,390 @@ class Table(object):
         """
         return NotImplemented
 
-    def _get_random_params(self):
+    def _get_random_params(self, content_gen=None):
         """
-        Returns a dictionary with field names as index and
-        its random values
+        Returns a list with the random values of the fields
         """
+        if content_gen is None:
+            content_gen = self._content_gen
 
-        values = []
-        for field in self._get_fields():
-            field.content_gen = self._content_gen
-            values.append(field.get_random_value())
+        return self._compile_row(content_gen)()
 
-        return values
+    def _compile_row(self, content_gen):
+        """
+        Returns a function without arguments that generates
+        the random params of a row with 'content_gen'.
+        Fields are compiled once (see Field.compile()), so generating
+        a row only calls each field's generator.
+        """
+        generators = [i.compile(content_gen) for i in self._get_fields()]
+        samplers, uniques = self._get_row_plan()
+
+        # Values of unique keys are set by _generate_block()
+        for positions, _ in uniques:
+            for i in positions:
+                generators[i] = _none
+
+        if len(samplers) == 0:
+            return lambda: [generate() for generate in generators]
+
+        # Values of foreign keys are replaced by sampled parent keys
+        for positions, pool in samplers:
+            for i in positions:
+                generators[i] = _none
+
+        def generate_row():
+            row = [generate() for generate in generators]
+            for positions, pool in samplers:
+                for i, value in zip(positions, pool.sample(content_gen)):
+                    row[i] = value
+
+            return row
+
+        return generate_row
+
+    def _get_row_plan(self):
+        """
+        Returns (samplers, uniques): the foreign keys sampled at random
+        (see _get_key_samplers()) and a list of (field positions,
+        function) with the unique keys, each function returns the
+        values of the key for a row index, so rows never collide.
+        """
+        if self._row_plan is not None:
+            return self._row_plan
+
+        uniques = []
+        unique_positions = set()
+        for (positions, field, pools), start in zip(
+                self._plan_unique_keys(), self._get_unique_starts()):
+            uniques.append((positions, _compile_unique(field, pools, start)))
+            unique_positions.update(positions)
+
+        samplers = [
+            (positions, pool)
+            for positions, pool in self._get_key_samplers()
+            if not set(positions) <= unique_positions
+        ]
+
+        self._row_plan = (samplers, uniques)
+        return self._row_plan
+
+    def _plan_unique_keys(self):
+        """
+        Returns a list of (field positions, field, pools) for the unique
+        keys of the table (see DataBase.get_unique_keys()).
+        A key is made unique by one of its fields (see
+        Field.get_unique_value()) or, if its fields are foreign keys,
+        by combining the keys of their parent tables ('pools').
+        Keys of fields without unique values are left random.
+        """
+        fields = self._get_fields()
+        names = [i.name for i in fields]
+        samplers = self._get_key_samplers()
+        sampled = set([i for positions, _ in samplers for i in positions])
+
+        plan = []
+        unique_sets = []
+        used_samplers = []
+        keys = self._database.get_unique_keys().get(self.name, [])
+        for key in sorted(keys, key=len):
+            if not set(key) <= set(names):
+                continue
+
+            positions = set([names.index(i) for i in key])
+            if any([i <= positions for i in unique_sets]):
+                continue
+
+            capable = [i for i in sorted(positions)
+                       if i not in sampled and fields[i].unique_support]
+            if len(capable) > 0:
+                plan.append(([capable[0]], fields[capable[0]], None))
+                unique_sets.append(set([capable[0]]))
+                continue
+
+            key_samplers = [
+                i for i in samplers
+                if set(i[0]) <= positions and i not in used_samplers
+            ]
+            if len(key_samplers) > 0:
+                plan.append((
+                    [i for sampler_positions, _ in key_samplers
+                     for i in sampler_positions],
+                    None,
+                    [pool for _, pool in key_samplers]
+                ))
+                unique_sets.append(set(plan[-1][0]))
+                used_samplers += key_samplers
+
+        return plan
+
+    def _get_unique_starts(self):
+        """
+        Returns the index of the first row of each unique key of
+        _plan_unique_keys(), after the values already in the table.
+        Rows before 'start' (e.g. of a resumed fill) are already in the
+        table, so they aren't counted twice.
+        """
+        if self._unique_starts is not None:
+            return self._unique_starts
+
+        plan = self._plan_unique_keys()
+        self._unique_starts = []
+        if len(plan) == 0:
+            return self._unique_starts
+
+        fields = [field for _, field, _ in plan if field is not None]
+        columns = ["COUNT(*)"] + ["MAX({0})".format(i.name) for i in fields]
+
+        c = self.get_cursor()
+        c.execute("SELECT {0} FROM {1}".format(", ".join(columns), self.name))
+        row = c.fetchone()
+        c.close()
+
+        rows, max_values = row[0], list(row[1:])
+        for _, field, _ in plan:
+            if field is None:
+                unique_start = rows
+            else:
+                unique_start = field.get_unique_start(max_values.pop(0), rows)
+
+            self._unique_starts.append(max(unique_start - self.start, 0))
+
+        return self._unique_starts
+
+    def _get_key_samplers(self):
+        """
+        Returns a list of (field positions, KeyPool) with the foreign keys
+        whose parent table has keys, see DataBase.get_key_pool().
+        Other foreign keys get random values like any field.
+        """
+        if self._key_samplers is not None:
+            return self._key_samplers
+
+        names = [i.name for i in self._get_fields()]
+        self._key_samplers = []
+        for fk in self._database.get_foreign_keys().get(self.name, []):
+            if not set(fk.columns) <= set(names):
+                continue
+
+            pool = self._database.get_key_pool(fk.parent, fk.parent_columns)
+            if len(pool) > 0:
+                positions = [names.index(i) for i in fk.columns]
+                self._key_samplers.append((positions, pool))
+
+        return self._key_samplers
 
-    @abstractmethod
     def _get_fields(self):
         """
         Returns fields in the Table
         Used with query returned in _create_insert_sql() and
         _get_random_params()
         """
+        if self._fields is None:
+            self._fields = self._database.load_fields(
+                self.name, self._introspect_fields)
+
+        return self._fields
+
+    @abstractmethod
+    def _introspect_fields(self):
+        """
+        Creates the fields from the table's schema in the database
+        (see _get_fields())
+        """
         return NotImplemented
 
 
+def _none():
+    return None
+
+
+def _compile_unique(field, pools, start):
+    """
+    Returns a function with the values of a unique key for a row index
+    (see Table._plan_unique_keys())
+    """
+    if field is not None:
+        get_unique_value = field.get_unique_value
+        return lambda index: (get_unique_value(start + index),)
+
+    def get_keys(index):
+        # Each row gets a different combination of parent keys
+        index += start
+        values = []
+        for pool in pools:
+            index, i = divmod(index, len(pool))
+            values += pool.get(i)
+
+        return values
+
+    return get_keys
+
+
+class _ErrorWindow(object):
+    """
+    Ratio of failed rows among the last 'size' rows (rows are recorded
+    in batches, so the window may be a little bigger).
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._batches = deque()
+        self._rows = 0
+        self._errors = 0
+
+    def record(self, rows, errors):
+        self._batches.append((rows, errors))
+        self._rows += rows
+        self._errors += errors
+
+        while len(self._batches) > 1 \
+                and self._rows - self._batches[0][0] >= self.size:
+            rows, errors = self._batches.popleft()
+            self._rows -= rows
+            self._errors -= errors
+
+    def get_ratio(self):
+        """
+        Returns the ratio of failed rows, 0.0 until 'size' rows
+        were recorded.
+        """
+        if self._rows < self.size:
+            return 0.0
+
+        return float(self._errors) / self._rows
+
+
+class _Pipeline(object):
+    """
+    Iterable over the items of 'items', produced by another thread
+    into a queue of up to 'depth' items.
+    'producer_wait' and 'consumer_wait' are the seconds the producer
+    waited for a full queue and the consumer for an empty one, so the
+    side that waited less is the bottleneck.
+    """
+
+    # Seconds between checks of close() while waiting
+    poll_interval = 0.1
+
+    def __init__(self, items, depth):
+        self.producer_wait = 0.0
+        self.consumer_wait = 0.0
+        self._queue = Queue.Queue(depth)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(items,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __iter__(self):
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except Queue.Empty:
+                began = time.time()
+                entry = self._get()
+                self.consumer_wait += time.time() - began
+
+            done, item = entry
+            if done:
+                # The producer's error, if any, is raised here
+                if item is not None:
+                    raise item[0], item[1], item[2]
+
+                return
+
+            yield item
+
+    def close(self):
+        """
+        Stops the producer (items not consumed are discarded)
+        """
+        self._closed.set()
+        self._thread.join()
+
+    def _get(self):
+        # Waiting with a timeout keeps the thread interruptible
+        while True:
+            try:
+                return self._queue.get(True, self.poll_interval)
+            except Queue.Empty:
+                pass
+
+    def _produce(self, items):
+        try:
+            for item in items:
+                if not self._put((False, item)):
+                    return
+
+            self._put((True, None))
+        except Exception:
+            self._put((True, sys.exc_info()))
+
+    def _put(self, entry):
+        """
+        Puts 'entry' in the queue, returns False if closed before
+        """
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except Queue.Full:
+            pass
+
+        began = time.time()
+        try:
+            while not self._closed.is_set():
+                try:
+                    self._queue.put(entry, True, self.poll_interval)
+                    return True
+                except Queue.Full:
+                    pass
+
+            return False
+        finally:
+            self.producer_wait += time.time() - began
+
+
+class _ShardReport(object):
+    """
+    Collects errors of a table filled in a pool process
+    """
+
+    def __init__(self):
+        self.errors = []
+
+    def error_received(self, e):
+        self.errors.append(InsertError(str(e), getattr(e, "errno", None)))
+
+
+def _ignore_interrupts():
+    # Pool processes are stopped by the process filling the table
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _fill_shard(args):
+    """
+    Fills a range of rows in a pool process (see Table._fill_sharded()).
+    Returns the number of rows processed, the errors and if the range
+    was abandoned.
+    """
+    (table_cls, database, name, content_gen, start, stop,
+     batch_size, commit_every, breaker, unique_starts, queue_depth) = args
+
+    table = table_cls(database, name, content_gen)
+    table._unique_starts = unique_starts
+    report = _ShardReport()
+    table.on_insert_error.register(report.error_received)
+
+    try:
+        table._fill_range(start, stop, batch_size, commit_every, breaker,
+                          queue_depth)
+        database.commit()
+    finally:
+        database.close()
+
+    return table.rows_done, report.errors, table.abandoned
+
+
 class Field(object):
     """
     Abstract entity representing a field in the Database
@@ -97,6 +974,13 @@ class Field(object):
 
     content_gen = None  # Instance of conntent generator
 
+    # Chances of a NULL value (if nullable) and of the default value
+    null_ratio = 0.2
+    default_ratio = 0.2
+
+    # Fields able to generate unique values (see get_unique_value())
+    unique_support = False
+
     def __init__(self, name, nullable=False, default=None, *args, **kargs):
         self.name = name
         self.nullable = nullable
@@ -105,14 +989,104 @@ class Field(object):
     def get_name(self):
         return self.name
 
+    def __getstate__(self):
+        # Content generators aren't saved with fields (see SchemaCache)
+        state = self.__dict__.copy()
+        state.pop("content_gen", None)
+        return state
+
     def get_random_value(self):
-        if self.nullable and self.content_gen.get_int(0, 4) == 1:
-            return None
+        return self.compile(self.content_gen)()
+
+    def get_unique_value(self, index):
+        """
+        Returns a value different for each 'index' (used in unique keys),
+        implemented by the fields with 'unique_support'.
+        """
+        return NotImplemented
 
-        if self.default is not None and self.content_gen.get_int(0, 4) == 1:
-            return self.default
+    def get_unique_start(self, max_value, rows):
+        """
+        Returns the first index given to get_unique_value() so values
+        don't collide with the ones in the table, where 'max_value' is
+        the greatest value of the field and 'rows' the number of rows.
+        """
+        return rows
 
-        return self._get_random_value()
+    def get_random_values(self, n):
+        """
+        Returns a list with 'n' random values (see get_random_value()).
+        NULL and default values are chosen with a single batch draw.
+        """
+        values = self._get_random_values(n)
+
+        null_ratio, default_ratio = self._get_ratios()
+        if default_ratio == 0.0:
+            return values
+
+        for i, ratio in enumerate(self.content_gen.get_randoms(n)):
+            if ratio < null_ratio:
+                values[i] = None
+            elif ratio < default_ratio:
+                values[i] = self.default
+
+        return values
+
+    def _get_random_values(self, n):
+        """
+        Returns a list with 'n' values (NULL and default values aside).
+        It can be overridden to use the batch methods of the content
+        generator (see util.ContentGen).
+        """
+        generate = self._compile(self.content_gen)
+        return [generate() for i in xrange(n)]
+
+    def _get_ratios(self):
+        """
+        Returns the draw limits of NULL and default values: a draw
+        in [0, 1) below the first one is NULL, below the second default.
+        """
+        null_ratio = self.null_ratio if self.nullable else 0.0
+        default_ratio = null_ratio
+        if self.default is not None:
+            default_ratio += self.default_ratio
+
+        return null_ratio, default_ratio
+
+    def compile(self, content_gen):
+        """
+        Returns a function without arguments that generates random values
+        of this field with 'content_gen' (see Table._compile_row()).
+        NULL and default values are chosen with a single draw.
+        """
+        self.content_gen = content_gen
+        generate = self._compile(content_gen)
+
+        null_ratio, default_ratio = self._get_ratios()
+        default = self.default
+        if default_ratio == 0.0:
+            return generate
+
+        draw = content_gen.get_random_function()
+
+        def generate_value():
+            ratio = draw()
+            if ratio < null_ratio:
+                return None
+
+            if ratio < default_ratio:
+                return default
+
+            return generate()
+
+        return generate_value
+
+    def _compile(self, content_gen):
+        """
+        Returns a function that generates values (NULL and default values
+        aside). It can be overridden to bind everything it needs once.
+        """
+        return self._get_random_value
 
     @abstractmethod
     def _get_random_value(self):
@@ -128,36 +1102,585 @@ class DataBase(object):
 
     _table_cls = Table
 
+    # Causes of insert errors by driver error code and by a text in
+    # the error message (for drivers without codes), see classify_error()
+    error_codes = {}
+    error_messages = []
+
+    # What is done with a table stopped by too many errors (see fill())
+    breaker_actions = ["abandon", "defer"]
+
     def __init__(self, content_gen):
         self._content_gen = content_gen
         self.show_errors = False
         self._filter_args = None
 
+        # Instance of SchemaCache, see load_fields()
+        self.schema_cache = None
+
+        # Options of the fields of each column by table (e.g. the bounds
+        # of dates), see load_fields()
+        self.column_options = {}
+
+        # Fields of the tables being filled, see _load_schemas()
+        self._loaded_fields = {}
+
+        # Instance of Checkpoint, see fill()
+        self.checkpoint = None
+
+        # Rows of each table (instead of fill()'s 'n') and if tables are
+        # only filled up to them, see fill()
+        self.row_targets = {}
+        self.top_up = False
+
+        # If the last fill was stopped, see stop()
+        self.interrupted = False
+        self._stop_requested = False
+
+        # Connections are not shared between threads (see get_conn())
+        self._local = threading.local()
+
+        # Signals from tables filled in parallel are emitted one at a time
+        self._signal_lock = threading.RLock()
+
+        # Foreign keys and parent keys, see get_key_pool()
+        self._foreign_keys = None
+        self._unique_keys = None
+        self._key_pools = {}
+        self._key_pools_lock = threading.Lock()
+
         self.on_change_table = Signal()
         self.on_insert = Signal()
+        self.on_rows_inserted = Signal()
         self.on_insert_error = Signal()
+        self.on_commit = Signal()
+        self.on_pipeline_stats = Signal()
+
+        # Signal when a table is stopped by too many errors, it receives
+        # the table info, the number of rows processed and if the table
+        # will be filled again (see fill())
+        self.on_table_abandoned = Signal()
+
+        # Signal when a table's fill ends (also when it's abandoned or
+        # interrupted), it receives the table info and the rows the
+        # table has of the fill
+        self.on_table_finished = Signal()
+
+    def fill(self, n=10, commit_per_table=False, jobs=1,
+             breaker_action="abandon", **kargs):
+        """
+        Fills all tables (see filter()) with 'n' rows each, or with the
+        rows given in 'row_targets' for the tables in it.
+        Other arguments are given to Table.fill().
+        With 'commit_per_table', each table is committed after filled,
+        otherwise all of them are committed at the end.
+        With 'jobs' > 1, tables are filled concurrently by that number
+        of threads, each one with its own connection.
+        Tables are filled after the tables they reference, and their
+        foreign keys get values of the referenced tables' keys.
+        A table stopped by too many errors (see 'max_error_ratio' in
+        Table.fill()) is abandoned or, with 'breaker_action' "defer",
+        filled again with the remaining rows after the other tables.
+        With a 'checkpoint', each commit saves the rows committed of each
+        table, and tables continue from the rows saved in it (sharded
+        fills can't be checkpointed, as their ranges are committed out
+        of order, see Table.fill()).
+        With 'top_up', tables continue from the rows they have (see
+        count_rows()), so only the missing rows are inserted.
+        After stop(), the rows processed are committed and 'interrupted'
+        is set.
+        """
+        if breaker_action not in self.breaker_actions:
+            raise ValueError("Unexpected breaker action: " + breaker_action)
+
+        if self.checkpoint is not None and kargs.get("shards", 1) > 1:
+            raise ValueError("Sharded fills can't be checkpointed")
+
+        unknown = self.get_unknown_tables(
+            self.row_targets.keys() + self.column_options.keys())
+        if len(unknown) > 0:
+            raise Exception("Unexpected tables: " + ", ".join(unknown))
+
+        defer = breaker_action == "defer"
+        c = self.get_cursor()
+
+        self._foreign_keys = None
+        self._unique_keys = None
+        self._key_pools = {}
+        self._stop_requested = False
+        self.interrupted = False
+
+        tables = self._sort_tables(self.get_tables())
+        self._load_schemas(tables)
+
+        self._before_fill()
+        try:
+            if jobs > 1 and len(tables) > 1:
+                self._fill_parallel(
+                    tables, jobs, n, commit_per_table, defer, kargs)
+            else:
+                deferred = []
+                for name in tables:
+                    if self._stop_requested:
+                        break
+
+                    rows = self.get_target_rows(name, n)
+                    start = self.get_start_row(name)
+                    if start >= rows:
+                        continue
+
+                    table = self._fill_table(
+                        name, self._content_gen, rows, commit_per_table,
+                        kargs, defer, start)
+                    if table.abandoned and defer:
+                        deferred.append(
+                            (name, rows, start + table.rows_done))
+
+                for name, rows, start in deferred:
+                    if self._stop_requested:
+                        break
+
+                    self._fill_table(
+                        name, self._content_gen, rows, commit_per_table,
+                        kargs, False, start)
+
+            self.commit()
+            self.interrupted = self._stop_requested
+        finally:
+            self._after_fill()
+            self._loaded_fields = {}
+
+            if self.schema_cache is not None:
+                self.schema_cache.save()
+
+        c.close()
+
+    def _load_schemas(self, tables):
+        """
+        Reads the fields and keys of 'tables' before inserting any row.
+        Reading a schema may commit the rows inserted so far (SQLite
+        commits before PRAGMAs) without saving them in the checkpoint.
+        """
+        self.get_foreign_keys()
+        self.get_unique_keys()
 
-    def fill(self, *args, **kargs):
+        self._loaded_fields = {}
+        for name in tables:
+            table = self._table_cls(self, name, self._content_gen)
+            self._loaded_fields[name] = table._get_fields()
+
+    def stop(self):
+        """
+        Asks the running fill to stop after the current batch of each
+        table (e.g. from a signal handler), see fill().
+        """
+        self._stop_requested = True
+
+    @property
+    def stop_requested(self):
+        return self._stop_requested
+
+    def get_unknown_tables(self, names):
+        """
+        Returns the sorted 'names' that aren't tables of the database
+        (e.g. of 'row_targets'), tables out of the filter are known.
+        """
+        if len(names) == 0:
+            return []
+
+        return sorted(set(names) - set(self._query_tables()))
+
+    def get_target_rows(self, name, n):
+        """
+        Returns the rows of the table 'name' after a fill of 'n' rows
+        """
+        return self.row_targets.get(name, n)
+
+    def get_start_row(self, name):
+        """
+        Returns the first row to fill of the table 'name', the rows it
+        has with 'top_up' or the rows saved in the checkpoint
+        """
+        if self.top_up:
+            return self.count_rows(name)
+
+        if self.checkpoint is None:
+            return 0
+
+        return self.checkpoint.get_rows(name)
+
+    def count_rows(self, name):
+        """
+        Returns the number of rows of the table 'name', subclasses may
+        return a cheaper estimate.
+        """
         c = self.get_cursor()
+        c.execute("SELECT COUNT(*) FROM {0}".format(name))
+        (rows,) = c.fetchone()
+        c.close()
+
+        return int(rows)
+
+    def set_processed_rows(self, name, rows):
+        """
+        Sets the rows processed of the table 'name' (by this thread's
+        connection), saved in the checkpoint with the next commit.
+        """
+        if self.checkpoint is None:
+            return
+
+        if not hasattr(self._local, "processed_rows"):
+            self._local.processed_rows = {}
+
+        self._local.processed_rows[name] = rows
 
-        for table in self.get_tables():
-            table = self._table_cls(self, table, self._content_gen)
-            table.show_errors = self.show_errors
+    def _fill_table(self, name, content_gen, n, commit_per_table, kargs,
+                    defer=False, start=0):
+        """
+        Fills the table 'name' (from the row 'start') and returns it.
+        If the table is abandoned, on_table_abandoned is emitted with
+        'defer'. on_table_finished is emitted at the end.
+        """
+        table = self._table_cls(self, name, content_gen)
+        table.show_errors = self.show_errors
+        table.on_rows_inserted.register(self._on_rows_inserted_callback)
+        table.on_insert_error.register(self._on_insert_error_callback)
+        table.on_commit.register(self._on_commit_callback)
+        table.on_pipeline_stats.register(self._on_pipeline_stats_callback)
+        # The first row is given with the table, as it may be in the
+        # middle of it (e.g. resumed fills)
+        self._on_change_table_callback(dict(table.table_info, start=start))
+
+        # Per row signals are relayed only if someone is listening
+        if len(self.on_insert) > 0:
             table.on_insert.register(self._on_insert_callback)
-            table.on_insert_error.register(self._on_insert_error_callback)
-            self.on_change_table(table.table_info)
-            table.fill(*args, **kargs)
 
-        self.commit()
+        table.fill(n, start=start, **kargs)
+
+        if commit_per_table:
+            table.commit()
+        else:
+            self.set_processed_rows(name, start + table.rows_done)
+
+        if table.abandoned:
+            with self._signal_lock:
+                self.on_table_abandoned(
+                    table.table_info, table.rows_done, defer)
+
+        with self._signal_lock:
+            self.on_table_finished(
+                table.table_info, start + table.rows_done)
+
+        return table
+
+    def _fill_parallel(self, tables, jobs, n, commit_per_table, defer,
+                       kargs):
+        """
+        Fills tables with a pool of 'jobs' threads. Each thread has its
+        own connection (committed when the thread has no more tables)
+        and each table its own content generator.
+        With 'defer', abandoned tables are queued again (once).
+        """
+        queue = Queue.Queue()
+        for name in tables:
+            queue.put((name, self._content_gen.spawn(),
+                       self.get_start_row(name), defer))
+
+        # Tables wait for the tables they reference (queued before them)
+        parents = self._get_parents(tables, ordered=True)
+        referenced = set([i for name in tables for i in parents[name]])
+        filled = dict([(name, threading.Event()) for name in tables])
+        errors = []
+
+        def worker():
+            try:
+                while len(errors) == 0 and not self._stop_requested:
+                    try:
+                        name, content_gen, start, defer_table = \
+                            queue.get_nowait()
+                    except Queue.Empty:
+                        break
+
+                    try:
+                        for parent in parents[name]:
+                            while not filled[parent].is_set():
+                                filled[parent].wait(0.1)
+
+                        if len(errors) > 0 or self._stop_requested:
+                            break
+
+                        rows = self.get_target_rows(name, n)
+                        if start >= rows:
+                            continue
+
+                        table = self._fill_table(
+                            name, content_gen, rows, commit_per_table, kargs,
+                            defer_table, start)
+                        if table.abandoned and defer_table:
+                            queue.put((name, content_gen,
+                                       start + table.rows_done, False))
+
+                        # Rows are visible to the other connections
+                        if name in referenced:
+                            self.commit()
+                    finally:
+                        filled[name].set()
+
+                self.commit()
+            except Exception:
+                errors.append(sys.exc_info())
+            finally:
+                self.close()
+
+        threads = [threading.Thread(target=worker)
+                   for i in xrange(min(jobs, len(tables)))]
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        for thread in threads:
+            # Joining with a timeout keeps the main thread interruptible
+            while thread.is_alive():
+                thread.join(0.1)
+
+        if len(errors) > 0:
+            raise errors[0][0], errors[0][1], errors[0][2]
+
+    def __getstate__(self):
+        # Connections, locks and signal slots stay in this process
+        # (databases are copied to other processes by Table.fill())
+        state = self.__dict__.copy()
+        del state["_local"]
+        del state["_signal_lock"]
+        del state["_key_pools_lock"]
+
+        # Only this process saves the checkpoint (see commit())
+        state["checkpoint"] = None
+        for key, value in state.items():
+            if isinstance(value, Signal):
+                state[key] = Signal()
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._signal_lock = threading.RLock()
+        self._key_pools_lock = threading.Lock()
+
+    def _sort_tables(self, tables):
+        """
+        Sorts 'tables' so each table comes after the tables it references
+        (tables in a cycle of references are kept in their order).
+        """
+        parents = self._get_parents(tables)
+        done = set()
+        ordered = []
+        while len(ordered) < len(tables):
+            ready = [i for i in tables
+                     if i not in done and parents[i] <= done]
+            if len(ready) == 0:
+                ready = [i for i in tables if i not in done][:1]
+
+            ordered += ready
+            done.update(ready)
+
+        return ordered
+
+    def _get_parents(self, tables, ordered=False):
+        """
+        Returns a dict with the set of tables in 'tables' referenced
+        by each table (references to itself are left out).
+        With 'ordered', only tables before it in 'tables' are included
+        (so references closing a cycle are left out).
+        """
+        foreign_keys = self.get_foreign_keys()
+        parents = {}
+        for pos, name in enumerate(tables):
+            candidates = tables[:pos] if ordered else tables
+            parents[name] = set([
+                fk.parent for fk in foreign_keys.get(name, [])
+                if fk.parent != name and fk.parent in candidates
+            ])
+
+        return parents
+
+    def get_foreign_keys(self):
+        """
+        Returns a dict with a list of ForeignKey for each table
+        """
+        if self._foreign_keys is None:
+            self._foreign_keys = self._query_foreign_keys()
+
+        return self._foreign_keys
+
+    def _query_foreign_keys(self):
+        """
+        Reads the foreign keys of the tables (see get_foreign_keys()),
+        it's overridden by the subclasses that support them.
+        """
+        return {}
+
+    def classify_error(self, e):
+        """
+        Returns the cause of an insert error, e.g. "duplicate-key",
+        "foreign-key", "data-too-long", "deadlock", "connection-lost"
+        or "other" (see error_codes and error_messages).
+        """
+        code = getattr(e, "errno", None)
+        if code is None:
+            code = getattr(e, "code", None)
+
+        if code in self.error_codes:
+            return self.error_codes[code]
+
+        message = str(e)
+        for text, cause in self.error_messages:
+            if text in message:
+                return cause
+
+        return "other"
+
+    def get_unique_keys(self):
+        """
+        Returns a dict with a list of unique keys (including primary
+        keys) for each table, each one a tuple of column names.
+        """
+        if self._unique_keys is None:
+            self._unique_keys = self._query_unique_keys()
+
+        return self._unique_keys
+
+    def _query_unique_keys(self):
+        """
+        Reads the unique keys of the tables (see get_unique_keys()),
+        it's overridden by the subclasses that support them.
+        """
+        return {}
+
+    def get_key_pool(self, table, columns):
+        """
+        Returns a KeyPool with the keys ('columns' values) of 'table'.
+        Keys are read from the database once per fill, so the referenced
+        tables must be filled first (see _sort_tables()).
+        """
+        key = (table, tuple(columns))
+        with self._key_pools_lock:
+            if key not in self._key_pools:
+                self._key_pools[key] = self._load_key_pool(table, columns)
+
+            return self._key_pools[key]
+
+    def _load_key_pool(self, table, columns):
+        pool = KeyPool(len(columns))
+
+        c = self.get_cursor()
+        c.execute("SELECT {0} FROM {1} ORDER BY {0}".format(
+            ", ".join(columns), table))
+        for row in c:
+            pool.add(row)
+
         c.close()
 
+        return pool
+
+    def _before_fill(self):
+        """
+        Called before filling the tables, e.g. to change session settings.
+        """
+        pass
+
+    def _after_fill(self):
+        """
+        Called after filling the tables (even if it failed).
+        """
+        pass
+
+    def _on_change_table_callback(self, *args, **kargs):
+        with self._signal_lock:
+            self.on_change_table(*args, **kargs)
+
     def _on_insert_callback(self, *args, **kargs):
-        self.on_insert(*args, **kargs)
+        with self._signal_lock:
+            self.on_insert(*args, **kargs)
+
+    def _on_rows_inserted_callback(self, *args, **kargs):
+        with self._signal_lock:
+            self.on_rows_inserted(*args, **kargs)
 
     def _on_insert_error_callback(self, *args, **kargs):
-        self.on_insert_error(*args, **kargs)
+        with self._signal_lock:
+            self.on_insert_error(*args, **kargs)
+
+    def _on_commit_callback(self, *args, **kargs):
+        with self._signal_lock:
+            self.on_commit(*args, **kargs)
+
+    def _on_pipeline_stats_callback(self, *args, **kargs):
+        with self._signal_lock:
+            self.on_pipeline_stats(*args, **kargs)
+
+    def load_fields(self, name, introspect):
+        """
+        Returns the fields of the table 'name' created by 'introspect'
+        (with the table's 'column_options').
+        With a schema cache, fields are taken from it unless the table's
+        fingerprint or its column options changed (see
+        get_schema_fingerprint()).
+        Fields of the tables being filled are read once, before the fill
+        (see _load_schemas()).
+        """
+        if name in self._loaded_fields:
+            return self._loaded_fields[name]
+
+        if self.schema_cache is None:
+            return introspect()
+
+        fingerprint = self._get_cache_fingerprint(name)
+        if fingerprint is None:
+            return introspect()
+
+        key = self._get_schema_key(name)
+        fields = self.schema_cache.get(key, fingerprint)
+        if fields is None:
+            fields = introspect()
+            self.schema_cache.set(key, fingerprint, fields)
+
+        return fields
+
+    def get_schema_fingerprint(self, name):
+        """
+        Returns a value that changes when the schema of the table 'name'
+        changes, or None if the table can't be cached.
+        """
+        return None
+
+    def _get_cache_fingerprint(self, name):
+        """
+        Returns the fingerprint of the fields of the table 'name' in the
+        schema cache, None if they can't be cached
+        """
+        fingerprint = self.get_schema_fingerprint(name)
+        options = self.column_options.get(name)
+        if fingerprint is None or not options:
+            return fingerprint
+
+        return (fingerprint, sorted(options.items()))
+
+    def _get_schema_key(self, name):
+        """
+        Returns the key of the table 'name' in the schema cache
+        """
+        return (self.__class__.__module__, name)
 
     def get_tables(self):
+        return self._filter_tables(self._query_tables())
+
+    def _query_tables(self):
+        """
+        Returns all the tables of the database (see get_tables())
+        """
         c = self.get_cursor()
         tables = []
 
@@ -167,6 +1690,12 @@ class DataBase(object):
 
         c.close()
 
+        return tables
+
+    def _filter_tables(self, tables):
+        """
+        Returns the tables selected with filter() among 'tables'
+        """
         if self._filter_args is None:
             return tables
 
@@ -182,9 +1711,35 @@ class DataBase(object):
     def get_cursor(self):
         return self.get_conn().cursor()
 
+    def get_conn(self):
+        """
+        Returns the connection of the current thread
+        """
+        if not hasattr(self._local, "conn"):
+            self._local.conn = self._connect()
+
+        return self._local.conn
+
+    def close(self):
+        """
+        Closes the connection of the current thread
+        """
+        if hasattr(self._local, "conn"):
+            self._local.conn.close()
+            del self._local.conn
+
     def commit(self):
         self.get_conn().commit()
 
+        # Rows processed by this connection are committed now
+        processed = getattr(self._local, "processed_rows", None)
+        if self.checkpoint is not None and processed:
+            for name, rows in processed.items():
+                self.checkpoint.set_rows(name, rows)
+
+            self._local.processed_rows = {}
+            self.checkpoint.save()
+
     def filter(self, *args):
         """
         Filter param to fill
@@ -192,9 +1747,9 @@ class DataBase(object):
         self._filter_args = args
 
     @abstractmethod
-    def get_conn(self):
+    def _connect(self):
         """
-        Returns a connection object.
+        Returns a new connection object.
         It is overridden by the subclasses
         """
         return NotImplemented
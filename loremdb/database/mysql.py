@@ -1,64 +1,309 @@
 import core
 from importlib import import_module
-from loremdb.util import OptionsParser
+from loremdb.util import OptionsParser, max_text_len, get_unique_text, \
+    get_scaled_number
+from collections import OrderedDict
+from datetime import date, datetime
+import tempfile
 import re
 
 
 class Table(core.Table):
+    # Bytes of max_allowed_packet left out of the estimates made in
+    # _get_rows_per_statement() (e.g. for escaped characters)
+    packet_margin = 4096
+
+    # Rows written in each file sent with LOAD DATA when no
+    # batch size is given (see 'load-data' strategy in DataBase)
+    load_data_batch_size = 100000
+
+    # Most placeholders a prepared statement can have
+    max_prepared_params = 65535
+
     def __init__(self, *args, **kargs):
         super(Table, self).__init__(*args, **kargs)
         self.field_creator = FieldCreatorFromMysql()
-        self.__fields = None
+        self.__insert_sqls = {}
+        self.__rows_per_statement = None
+        self.__prepared_cursors = {}
 
-    def _create_insert_sql(self):
+    def _create_insert_sql(self, rows_num=1, placeholder="%s", ignore=False):
         fields_num = len(self._get_fields())
-        return "INSERT INTO {0} ({1}) VALUES ({2})".format(
+        values = "({0})".format(
+            ", ".join([placeholder for i in range(fields_num)]))
+        return "INSERT {0}INTO {1} ({2}) VALUES {3}".format(
+            "IGNORE " if ignore else "",
             self.name,
             ", ".join([i.name for i in self._get_fields()]),
-            ", ".join(["%s" for i in range(fields_num)])
+            ", ".join([values for i in range(rows_num)])
         )
 
-    def _get_fields(self):
-        if self.__fields is not None:
-            return self.__fields
+    def _get_insert_sql(self, rows_num):
+        if rows_num not in self.__insert_sqls:
+            placeholder = "?" if self._database.prepared else "%s"
+            self.__insert_sqls[rows_num] = self._create_insert_sql(
+                rows_num, placeholder, self._ignores_failed_rows(rows_num))
 
-        c = self.get_cursor()
+        return self.__insert_sqls[rows_num]
+
+    def fill(self, n=10, batch_size=None, *args, **kargs):
+        if self._database.strategy == "load-data" \
+                and (batch_size is None or batch_size <= 1):
+            batch_size = self.load_data_batch_size
+
+        super(Table, self).fill(n, batch_size, *args, **kargs)
+
+    def _fill_range(self, *args, **kargs):
+        try:
+            super(Table, self)._fill_range(*args, **kargs)
+        finally:
+            self._close_prepared_cursors()
+
+    def _execute_insert(self, cursor, rows_num, params):
+        """
+        Executes the INSERT statement of 'rows_num' rows with 'params'
+        and returns the cursor used.
+        With the database's 'prepared' option, each statement is
+        prepared once (in its own cursor) and then only its params are
+        sent, in the binary protocol.
+        """
+        if not self._database.prepared:
+            cursor.execute(self._get_insert_sql(rows_num), params)
+            return cursor
+
+        prepared = self.__prepared_cursors.get(rows_num)
+        if prepared is None:
+            prepared = self._database.get_conn().cursor(prepared=True)
+            self.__prepared_cursors[rows_num] = prepared
+
+        prepared.execute(self._get_insert_sql(rows_num), params)
+        return prepared
+
+    def _ignores_failed_rows(self, rows_num):
+        """
+        Returns if the INSERT of 'rows_num' rows skips failed rows
+        (INSERT IGNORE): a failed multi-row INSERT keeps the rows before
+        the failed one in non-transactional tables (e.g. MyISAM), so
+        they can't be inserted again one by one.
+        """
+        return rows_num > 1 and not self._database.is_transactional(
+            self.name)
+
+    def _close_prepared_cursors(self):
+        for cursor in self.__prepared_cursors.values():
+            cursor.close()
+
+        self.__prepared_cursors = {}
 
-        self.__fields = []
-        cols = [
-            "table_catalog", "numeric_precision",
-            "table_schema", "numeric_scale",
-            "table_name", "character_set_name",
-            "column_name", "collation_name",
-            "ordinal_position", "column_type",
-            "column_default", "column_key",
-            "is_nullable", "extra",
-            "data_type", "privileges",
-            "character_maximum_length", "column_comment",
-            "character_octet_length"
+    def _insert_row(self, cursor, sql, params):
+        try:
+            self._execute_insert(cursor, 1, params)
+        except Exception, e:
+            self._insert_failed(e)
+            return False
+
+        return True
+
+    def _insert_batch(self, cursor, sql, rows):
+        """
+        Sends rows with multi-row INSERT statements, each one with
+        as many rows as fit in the server's max_allowed_packet.
+        If a statement fails, its rows are inserted one by one.
+        In non-transactional tables statements skip failed rows instead
+        (see _ignores_failed_rows()), counted from the rows inserted.
+        With the 'load-data' strategy rows go through LOAD DATA instead.
+        """
+        if self._database.strategy == "load-data":
+            return self._load_data(cursor, rows)
+
+        rows = list(rows)
+        size = self._get_rows_per_statement()
+        for start in xrange(0, len(rows), size):
+            chunk = rows[start:start + size]
+            try:
+                used_cursor = self._execute_insert(
+                    cursor, len(chunk),
+                    [value for params in chunk for value in params]
+                )
+            except Exception:
+                for params in chunk:
+                    self._insert_row(cursor, sql, params)
+
+                continue
+
+            if self._ignores_failed_rows(len(chunk)):
+                self._report_skipped_rows(
+                    cursor, len(chunk) - max(used_cursor.rowcount, 0))
+
+    def _load_data(self, cursor, rows):
+        """
+        Writes rows in a tab-separated temporary file and loads it
+        with LOAD DATA LOCAL INFILE.
+        Rows rejected by the server (e.g. duplicated keys) are only
+        reported as warnings, so they are counted from the number of
+        loaded rows.
+        """
+        rows_num = 0
+        f = tempfile.NamedTemporaryFile(prefix="loremdb-", suffix=".tsv")
+        try:
+            for params in rows:
+                # Counted before writing, a row that can't be written
+                # fails with the others
+                rows_num += 1
+                f.write("\t".join([escape_load_data(i) for i in params]))
+                f.write("\n")
+
+            f.flush()
+            cursor.execute(self._create_load_data_sql(), (f.name,))
+        except Exception, e:
+            for params in rows:
+                rows_num += 1
+
+            for i in xrange(rows_num):
+                self._insert_failed(e)
+
+            return
+        finally:
+            f.close()
+
+        self._report_skipped_rows(cursor, rows_num - max(cursor.rowcount, 0))
+
+    def _report_skipped_rows(self, cursor, skipped):
+        """
+        Reports 'skipped' rows of the last statement as failed, with the
+        causes of its warnings. Only warnings of skipped rows are used,
+        others (e.g. truncated values) are of rows inserted anyway.
+        """
+        if skipped <= 0:
+            return
+
+        cursor.execute("SHOW WARNINGS")
+        warnings = [
+            LoadDataError(message, code)
+            for (level, code, message) in cursor
+            if code in self._database.skipped_row_codes
         ]
 
-        sql = """SELECT {0}
-            FROM information_schema.columns
-            WHERE table_schema = %s and table_name = %s
-            ORDER BY ordinal_position""".format(",".join(cols))
+        for i in xrange(skipped):
+            if i < len(warnings):
+                self._insert_failed(warnings[i])
+            else:
+                self._insert_failed(LoadDataError("Row skipped"))
+
+    def _create_load_data_sql(self):
+        columns = []
+        expressions = []
+        for i, field in enumerate(self._get_fields()):
+            if getattr(field, "load_data_expr", None) is None:
+                columns.append(field.name)
+                continue
+
+            # Value is read to a variable and converted by the server
+            columns.append("@v{0}".format(i))
+            expressions.append("{0} = {1}".format(
+                field.name, field.load_data_expr.format("@v{0}".format(i))
+            ))
+
+        sql = ("LOAD DATA LOCAL INFILE %s INTO TABLE {0} "
+               "CHARACTER SET utf8 "
+               "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+               "LINES TERMINATED BY '\\n' ({1})").format(
+            self.name, ", ".join(columns))
+
+        if len(expressions) > 0:
+            sql += " SET " + ", ".join(expressions)
+
+        return sql
+
+    def _get_rows_per_statement(self):
+        """
+        Estimates how many rows fit in a single INSERT statement
+        """
+        if self.__rows_per_statement is not None:
+            return self.__rows_per_statement
 
-        c.execute(sql, (self._database.database, self.name))
+        # Each value is followed by ", " and each row is wrapped by "(), "
+        row_length = 4 + sum(
+            [max(4, f.get_max_length()) + 2 for f in self._get_fields()]
+        )
 
-        for row in c:
-            self.__fields.append(
-                self.field_creator.create(dict(zip(cols, row)))
-            )
+        available = self._database.get_max_allowed_packet() \
+            - len(self._create_insert_sql(0)) - self.packet_margin
+
+        rows = max(1, available / row_length)
+        if self._database.prepared:
+            fields_num = len(self._get_fields())
+            rows = min(rows, self.max_prepared_params / fields_num)
+
+        self.__rows_per_statement = max(1, rows)
+        return self.__rows_per_statement
+
+    def _introspect_fields(self):
+        options = self._database.column_options.get(self.name, {})
+        columns = self._database.get_columns(self.name)
+
+        unexpected = set(options) - set([i["column_name"] for i in columns])
+        if len(unexpected) > 0:
+            raise Exception("Unexpected columns of '{0}': {1}".format(
+                self.name, ", ".join(sorted(unexpected))))
+
+        return [
+            self.field_creator.create(specs, options.get(specs["column_name"]))
+            for specs in columns
+        ]
+
+
+class LoadDataError(Exception):
+    """
+    Row rejected by the server in a LOAD DATA statement.
+    """
+
+    def __init__(self, message, code=None):
+        super(LoadDataError, self).__init__(message)
+        self.code = code
 
-        c.close()
 
-        return self.__fields
+_load_data_escapes = [
+    ("\\", "\\\\"),
+    ("\0", "\\0"),
+    ("\t", "\\t"),
+    ("\n", "\\n"),
+    ("\r", "\\r"),
+]
+
+
+def escape_load_data(value):
+    """
+    Formats a value to be written in a LOAD DATA file
+    (default FIELDS and LINES options).
+    """
+    if value is None:
+        return "\\N"
+
+    if isinstance(value, datetime):
+        value = value.strftime("%Y-%m-%d %H:%M:%S")
+    elif isinstance(value, date):
+        value = value.strftime("%Y-%m-%d")
+    elif isinstance(value, unicode):
+        value = value.encode("utf-8")
+    else:
+        value = str(value)
+
+    for char, escaped in _load_data_escapes:
+        value = value.replace(char, escaped)
+
+    return value
 
 
 class FieldCreatorFromMysql(object):
-    def create(self, mysql_specs):
+    def create(self, mysql_specs, options=None):
+        """
+        Creates the field of a column, 'options' are given to the field
+        (e.g. "start" and "end" of dates, see DataBase.column_options)
+        """
         field_class = self._get_field_class(mysql_specs["data_type"])
         specs = self._sanitize_specs(mysql_specs)
+        specs.update(options or {})
         return field_class(**specs)
 
     def _sanitize_specs(self, specs):
@@ -99,17 +344,48 @@ class IntegerField(core.Field):
     unsigned = False
     num_signed_max = 2147483647  # Int Default
 
+    unique_support = True
+
     def __init__(self, name, unsigned=False, *args, **kargs):
         super(IntegerField, self).__init__(name, *args, **kargs)
         self.unsigned = unsigned
 
     def _get_random_value(self):
+        start, end = self._get_range()
+        return self.content_gen.get_int(start, end)
+
+    def _compile(self, content_gen):
+        get_int = content_gen.get_int
+        start, end = self._get_range()
+        return lambda: get_int(start, end)
+
+    def _get_random_values(self, n):
+        start, end = self._get_range()
+        return self.content_gen.get_ints(start, end, n)
+
+    def _get_range(self):
         if self.unsigned:
-            return self.content_gen.get_int(0, self.num_signed_max * 2)
+            return 0, self.num_signed_max * 2
 
-        return self.content_gen.get_int(
-            self.num_signed_max * -1, self.num_signed_max
-        )
+        return self.num_signed_max * -1, self.num_signed_max
+
+    def get_unique_value(self, index):
+        # Values start at 1, as 0 is replaced in AUTO_INCREMENT columns
+        start, end = self._get_range()
+        first = max(start, 1)
+        return first + index % (end - first + 1)
+
+    def get_unique_start(self, max_value, rows):
+        if max_value is None:
+            return 0
+
+        return max(int(max_value), 0)
+
+    def get_max_length(self):
+        if self.unsigned:
+            return len(str(self.num_signed_max * 2))
+
+        return len(str(self.num_signed_max * -1))
 
 
 class TinyintField(IntegerField):
@@ -133,33 +409,65 @@ class BigintField(IntegerField):
 
 
 class DecimalField(core.Field):
-    def __init__(self, name, precision, scale=0, *args, **kargs):
+    """
+    Exact numbers with 'precision' digits, 'scale' of them decimals.
+    Each value is a single random integer of 'precision' digits scaled
+    by 10 ** -scale, returned as a Decimal (or a float with 'as_float').
+    """
+
+    as_float = False
+
+    def __init__(self, name, precision, scale=0, unsigned=False,
+                 *args, **kargs):
         super(DecimalField, self).__init__(name, *args, **kargs)
 
+        # Columns without scale (e.g. FLOAT) have only integer digits
+        if scale is None:
+            scale = 0
+
         if scale > precision:
             raise ValueError("Value of 'precision' must be >= 'scale' value")
 
         self.precision = precision
         self.scale = scale
+        self.unsigned = unsigned
+
+    def _get_range(self):
+        end = 10 ** self.precision - 1
+        if self.unsigned:
+            return 0, end
+
+        return -end, end
 
     def _get_random_value(self):
-        int_range = 10 ** (self.precision - self.scale) - 1
-        int_rand = self.content_gen.get_int(-1 * int_range, int_range)
-        decimal_range = 10 ** self.scale - 1
-        decimal_rand = self.content_gen.get_int(0, decimal_range)
-        return float("{0}.{1}".format(int_rand, decimal_rand))
+        return self._compile(self.content_gen)()
+
+    def _compile(self, content_gen):
+        get_int = content_gen.get_int
+        start, end = self._get_range()
+        scaled = get_scaled_number(self.scale, self.as_float)
+        return lambda: scaled(get_int(start, end))
+
+    def _get_random_values(self, n):
+        start, end = self._get_range()
+        scaled = get_scaled_number(self.scale, self.as_float)
+        return map(scaled, self.content_gen.get_ints(start, end, n))
+
+    def get_max_length(self):
+        # Digits plus sign and decimal point
+        return self.precision + 2
 
 
 class FloatField(DecimalField):
-    pass
+    as_float = True
 
 
 class RealField(DecimalField):
-    pass
+    as_float = True
 
 
 class DoubleField(DecimalField):
-    pass
+    as_float = True
 
 
 class NumericField(DecimalField):
@@ -170,35 +478,102 @@ class NumericField(DecimalField):
 
 
 class DateField(core.Field):
+    """
+    Days between 'start' and 'end' (dates, the content generator's
+    defaults if None) drawn from a precomputed table.
+    """
+
+    def __init__(self, name, start=None, end=None, *args, **kargs):
+        super(DateField, self).__init__(name, *args, **kargs)
+        self.start = self._get_bound(start)
+        self.end = self._get_bound(end)
+
+    def _get_bound(self, value):
+        # Bounds may be given as datetimes (e.g. by a manifest)
+        if isinstance(value, datetime):
+            return value.date()
+
+        return value
+
     def _get_random_value(self):
-        return self.content_gen.get_date()
+        return self.content_gen.get_date(self.start, self.end)
+
+    def _compile(self, content_gen):
+        return content_gen.get_date_function(self.start, self.end)
+
+    def _get_random_values(self, n):
+        return self.content_gen.get_dates(n, self.start, self.end)
+
+    def get_max_length(self):
+        return len("'YYYY-MM-DD'")
+
+
+class DatetimeField(DateField):
+    """
+    'YYYY-MM-DD HH:MM:SS' texts between 'start' and 'end' (datetimes)
+    """
 
+    def _get_bound(self, value):
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return datetime.combine(value, datetime.min.time())
+
+        return value
 
-class DatetimeField(core.Field):
     def _get_random_value(self):
-        return self.content_gen.get_datetime()
+        return self.content_gen.get_datetime_text(self.start, self.end)
+
+    def _compile(self, content_gen):
+        return content_gen.get_datetime_text_function(self.start, self.end)
+
+    def _get_random_values(self, n):
+        return self.content_gen.get_datetime_texts(n, self.start, self.end)
+
+    def get_max_length(self):
+        return len("'YYYY-MM-DD HH:MM:SS.ffffff'")
 
 
 class TimestampField(core.Field):
+    # Values are unix timestamps
+    load_data_expr = "FROM_UNIXTIME({0})"
+
     def _get_random_value(self):
         return 126144000 + self.content_gen.get_int(0, 315360000)
 
+    def _get_random_values(self, n):
+        return self.content_gen.get_ints(126144000, 126144000 + 315360000, n)
+
+    def get_max_length(self):
+        return len(str(126144000 + 315360000))
+
 
 class TimeField(core.Field):
     def _get_random_value(self):
-        return '{0}:{1}:{2}'.format(
-            self.content_gen.get_int(0, 23),
-            self.content_gen.get_int(0, 59),
-            self.content_gen.get_int(0, 59)
-        )
+        return self.content_gen.get_time_text()
+
+    def _compile(self, content_gen):
+        return content_gen.get_time_text_function()
+
+    def _get_random_values(self, n):
+        return self.content_gen.get_time_texts(n)
+
+    def get_max_length(self):
+        return len("'HH:MM:SS'")
 
 
 class YearField(core.Field):
     def _get_random_value(self):
         return self.content_gen.get_int(1990, 2020)
 
+    def _get_random_values(self, n):
+        return self.content_gen.get_ints(1990, 2020, n)
+
+    def get_max_length(self):
+        return 4
+
 
 class CharField(core.Field):
+    unique_support = True
+
     def __init__(self, name, length, *args, **kargs):
         super(CharField, self).__init__(name, *args, **kargs)
         self.length = length
@@ -206,6 +581,21 @@ class CharField(core.Field):
     def _get_random_value(self):
         return self.content_gen.get_text(self.length)
 
+    def _compile(self, content_gen):
+        get_text = content_gen.get_text
+        length = self.length
+        return lambda: get_text(length)
+
+    def _get_random_values(self, n):
+        return self.content_gen.get_texts(self.length, n)
+
+    def get_unique_value(self, index):
+        return get_unique_text(index, self.length)
+
+    def get_max_length(self):
+        # Quoted text, generated texts are never longer than max_text_len
+        return min(self.length, max_text_len) + 2
+
 
 class VarcharField(CharField):
     pass
@@ -231,6 +621,18 @@ class EnumField(core.Field):
     def _get_random_value(self):
         return self.content_gen.get_in_list(self.options)
 
+    def _compile(self, content_gen):
+        get_in_list = content_gen.get_in_list
+        options = self.options
+        return lambda: get_in_list(options)
+
+    def _get_random_values(self, n):
+        return self.content_gen.get_in_lists(self.options, n)
+
+    def get_max_length(self):
+        # Quoted option, each quote inside it is escaped
+        return max([len(i) * 2 for i in self.options] + [0]) + 2
+
     @classmethod
     def parse(cls, enum_str):
         m = re.search(cls.get_spec_regex(), enum_str)
@@ -251,17 +653,119 @@ class SetField(EnumField):
         options = self.content_gen.get_list_subset(self.options)
         return ",".join(sorted(options))
 
+    def _compile(self, content_gen):
+        # Overrides EnumField's version
+        return self._get_random_value
+
+    def _get_random_values(self, n):
+        # Same draws as get_list_subset(), made with two get_ints() calls
+        options = self.options
+        sizes = self.content_gen.get_ints(1, len(options), n)
+        indexes = self.content_gen.get_ints(0, len(options) - 1, sum(sizes))
+
+        values = []
+        pos = 0
+        for size in sizes:
+            subset = set([options[i] for i in indexes[pos:pos + size]])
+            values.append(",".join(sorted(subset)))
+            pos += size
+
+        return values
+
+    def get_max_length(self):
+        # All quoted options separated by commas
+        return sum([len(i) * 2 + 1 for i in self.options]) + 2
+
     @classmethod
     def get_spec_regex(self):
         return r"^set\((.*)\)$"
 
 
 class DataBase(core.DataBase):
+    """
+    MySQL database.
+
+    Strategies (how rows are sent to the server):
+
+    insert:
+        INSERT statements (multi-row statements with batches).
+
+    load-data:
+        Batches are written in temporary files and loaded with
+        LOAD DATA LOCAL INFILE (the server must allow 'local_infile').
+
+    With 'prepared', INSERT statements are prepared in the server once
+    for each table and number of rows, and executed with their params
+    only (see Table._execute_insert()).
+
+    With 'bulk_session', connections used to fill tables skip foreign
+    key and unique checks and binary logging, keys of tables whose
+    engine supports it are disabled while filling (and rebuilt after)
+    and filled tables are analyzed at the end.
+    """
+
     _table_cls = Table
 
+    strategies = ["insert", "load-data"]
+
+    # Server and client error codes (also found in LOAD DATA warnings)
+    error_codes = {
+        1022: "duplicate-key",
+        1062: "duplicate-key",
+        1586: "duplicate-key",
+        1216: "foreign-key",
+        1217: "foreign-key",
+        1451: "foreign-key",
+        1452: "foreign-key",
+        1406: "data-too-long",
+        1265: "data-too-long",
+        1264: "out-of-range",
+        1048: "not-null",
+        1364: "not-null",
+        1213: "deadlock",
+        1205: "deadlock",
+        2006: "connection-lost",
+        2013: "connection-lost",
+        2055: "connection-lost",
+    }
+
+    # Codes of warnings of rows skipped by LOAD DATA and INSERT IGNORE
+    # (see error_codes)
+    skipped_row_codes = [1022, 1062, 1586, 1216, 1452, 1526]
+
+    # Session variables changed with 'bulk_session' (see _before_fill())
+    bulk_session_vars = [
+        ("foreign_key_checks", 0),
+        ("unique_checks", 0),
+        ("autocommit", 0),
+        ("sql_log_bin", 0),
+    ]
+
+    # Engines supporting ALTER TABLE ... DISABLE KEYS
+    disable_keys_engines = ["MyISAM", "Aria"]
+
+    # Engines without transactions (see is_transactional())
+    non_transactional_engines = [
+        "MyISAM", "Aria", "MEMORY", "CSV", "ARCHIVE", "MRG_MYISAM"]
+
+    # Columns read from information_schema.columns (see get_columns())
+    column_specs = [
+        "table_catalog", "numeric_precision",
+        "table_schema", "numeric_scale",
+        "table_name", "character_set_name",
+        "column_name", "collation_name",
+        "ordinal_position", "column_type",
+        "column_default", "column_key",
+        "is_nullable", "extra",
+        "data_type", "privileges",
+        "character_maximum_length", "column_comment",
+        "character_octet_length"
+    ]
+
     def __init__(
             self, content_gen, user, database, password=None,
-            host="localhost", engine="mysql.connector", port="3306"):
+            host="localhost", engine="mysql.connector", port="3306",
+            strategy="insert", prepared=False, bulk_session=False):
         super(DataBase, self).__init__(content_gen)
         self.user = user
         self.password = password
@@ -269,23 +773,333 @@ class DataBase(core.DataBase):
         self.port = port
         self.host = host
 
+        if strategy not in self.strategies:
+            raise ValueError("Unexpected strategy: " + strategy)
+
+        self.strategy = strategy
+        self.prepared = prepared
+        self.bulk_session = bulk_session
+
         self._engine = engine
+        self._max_allowed_packet = None
+        self._fingerprints = None
+        self._columns = None
+        self._engines = None
 
-    def get_conn(self):
-        if hasattr(self, "_conn"):
-            return self._conn
+        # Bulk session state, see _before_fill()
+        self._bulk_active = False
+        self._saved_session_vars = []
+        self._disabled_keys = []
 
+    def _connect(self):
         eng = import_module(self._engine)
 
-        self._conn = eng.connect(
+        params = {}
+        if self.strategy == "load-data":
+            params["client_flags"] = [eng.constants.ClientFlag.LOCAL_FILES]
+
+        conn = eng.connect(
             user=self.user,
             password=self.password,
             database=self.database,
             host=self.host,
-            port=self.port
+            port=self.port,
+            **params
         )
 
-        return self._conn
+        # Connections opened while filling (by other threads or
+        # processes) get the bulk session too
+        if self._bulk_active:
+            c = conn.cursor()
+            for name, value in self.bulk_session_vars:
+                self._set_session_var(c, name, value)
+
+            c.close()
+
+        return conn
+
+    def _before_fill(self):
+        if not self.bulk_session:
+            return
+
+        self.commit()
+        c = self.get_cursor()
+        self._saved_session_vars = []
+        for name, value in self.bulk_session_vars:
+            c.execute("SELECT @@session.{0}".format(name))
+            (old_value,) = c.fetchone()
+            if self._set_session_var(c, name, value):
+                self._saved_session_vars.append((name, old_value))
+
+        engines = self._get_engines()
+        self._disabled_keys = [
+            name for name in self.get_tables()
+            if engines.get(name) in self.disable_keys_engines
+        ]
+        for name in self._disabled_keys:
+            c.execute("ALTER TABLE `{0}` DISABLE KEYS".format(name))
+
+        c.close()
+        self._bulk_active = True
+
+    def _after_fill(self):
+        if not self.bulk_session:
+            return
+
+        self._bulk_active = False
+
+        # Nothing is pending if the fill was committed (ALTER TABLE
+        # would commit the rest)
+        self.get_conn().rollback()
+
+        c = self.get_cursor()
+        for name in self._disabled_keys:
+            c.execute("ALTER TABLE `{0}` ENABLE KEYS".format(name))
+
+        for name, value in self._saved_session_vars:
+            self._set_session_var(c, name, value)
+
+        tables = self.get_tables()
+        if len(tables) > 0:
+            c.execute("ANALYZE TABLE {0}".format(
+                ", ".join(["`{0}`".format(i) for i in tables])))
+            c.fetchall()
+
+        c.close()
+        self._saved_session_vars = []
+        self._disabled_keys = []
+
+    def is_transactional(self, name):
+        """
+        Returns if the engine of the table 'name' has transactions
+        """
+        engine = self._get_engines().get(name)
+        return engine not in self.non_transactional_engines
+
+    def _get_engines(self):
+        """
+        Returns the engine of each table (read once)
+        """
+        if self._engines is None:
+            c = self.get_cursor()
+            c.execute(
+                """SELECT table_name, engine
+                FROM information_schema.tables
+                WHERE table_schema = %s""", (self.database,))
+            self._engines = dict(c.fetchall())
+            c.close()
+
+        return self._engines
+
+    def _set_session_var(self, cursor, name, value):
+        """
+        Sets a session variable, returns False if the server refused it
+        (e.g. sql_log_bin needs the SUPER privilege).
+        """
+        try:
+            cursor.execute("SET SESSION {0} = %s".format(name), (value,))
+        except Exception, e:
+            if self.show_errors:
+                print "Exception: {0}".format(e)
+
+            return False
+
+        return True
+
+    def get_max_allowed_packet(self):
+        """
+        Returns the server's max_allowed_packet (in bytes)
+        """
+        if self._max_allowed_packet is None:
+            c = self.get_cursor()
+            c.execute("SELECT @@max_allowed_packet")
+            (self._max_allowed_packet,) = c.fetchone()
+            c.close()
+
+        return int(self._max_allowed_packet)
+
+    def filter(self, *args):
+        super(DataBase, self).filter(*args)
+        self._columns = None
+
+    def get_columns(self, name):
+        """
+        Returns the specs (from information_schema.columns) of the
+        columns of the table 'name'.
+        Columns are read when first needed, with a single query for all
+        the tables (see get_tables()) whose fields aren't in the schema
+        cache.
+        """
+        if self._columns is None:
+            self._columns = OrderedDict()
+
+        if name not in self._columns:
+            tables = [name] + [
+                i for i in self._get_uncached_tables()
+                if i != name and i not in self._columns
+            ]
+            self._columns.update(self._query_columns(tables))
+
+        return self._columns.get(name, [])
+
+    def _get_uncached_tables(self):
+        """
+        Returns the tables to fill whose fields aren't in the schema
+        cache (see DataBase.load_fields())
+        """
+        tables = self.get_tables()
+        if self.schema_cache is None:
+            return tables
+
+        return [
+            i for i in tables
+            if not self.schema_cache.contains(
+                self._get_schema_key(i), self._get_cache_fingerprint(i))
+        ]
+
+    def _query_columns(self, tables):
+        """
+        Returns an OrderedDict with a list of column specs for each
+        table in 'tables'.
+        """
+        sql = """SELECT {0}
+            FROM information_schema.columns
+            WHERE table_schema = %s AND table_name IN ({1})
+            ORDER BY table_name, ordinal_position""".format(
+            ",".join(self.column_specs), ", ".join(["%s"] * len(tables)))
+        params = [self.database] + list(tables)
+
+        c = self.get_cursor()
+        c.execute(sql, params)
+
+        columns = OrderedDict()
+        for row in c:
+            specs = dict(zip(self.column_specs, row))
+            columns.setdefault(specs["table_name"], []).append(specs)
+
+        c.close()
+
+        return columns
+
+    def _query_foreign_keys(self):
+        """
+        Reads foreign keys (to tables in the same database) from
+        information_schema.key_column_usage
+        """
+        c = self.get_cursor()
+        c.execute(
+            """SELECT table_name, constraint_name, column_name,
+                referenced_table_name, referenced_column_name
+            FROM information_schema.key_column_usage
+            WHERE table_schema = %s AND referenced_table_schema = %s
+            ORDER BY table_name, constraint_name, ordinal_position""",
+            (self.database, self.database))
+
+        keys = OrderedDict()
+        for (table, constraint, column, parent, parent_column) in c:
+            columns, parent_columns = keys.setdefault(
+                (table, constraint, parent), ([], []))
+            columns.append(column)
+            parent_columns.append(parent_column)
+
+        c.close()
+
+        foreign_keys = {}
+        for (table, _, parent), (columns, parent_columns) in keys.items():
+            foreign_keys.setdefault(table, []).append(core.ForeignKey(
+                tuple(columns), parent, tuple(parent_columns)))
+
+        return foreign_keys
+
+    def _query_unique_keys(self):
+        """
+        Reads primary and unique keys from information_schema.statistics
+        """
+        c = self.get_cursor()
+        c.execute(
+            """SELECT table_name, index_name, column_name
+            FROM information_schema.statistics
+            WHERE table_schema = %s AND non_unique = 0
+            ORDER BY table_name, index_name, seq_in_index""",
+            (self.database,))
+
+        keys = OrderedDict()
+        for (table, index, column) in c:
+            keys.setdefault((table, index), []).append(column)
+
+        c.close()
+
+        unique_keys = {}
+        for (table, _), columns in keys.items():
+            unique_keys.setdefault(table, []).append(tuple(columns))
+
+        return unique_keys
+
+    def count_rows(self, name):
+        """
+        Returns the number of rows of the table 'name' estimated in
+        information_schema.tables (exact in MyISAM, approximate
+        in InnoDB)
+        """
+        conn = self.get_conn()
+        c = conn.cursor()
+
+        # MySQL 8 keeps table statistics for a day by default, they're
+        # read again once per connection (older servers and MariaDB
+        # don't have the variable)
+        if getattr(self._local, "stats_expiry_conn", None) is not conn:
+            self._local.stats_expiry_conn = conn
+            c.execute(
+                "SHOW VARIABLES LIKE 'information_schema_stats_expiry'")
+            if len(c.fetchall()) > 0:
+                self._set_session_var(
+                    c, "information_schema_stats_expiry", 0)
+
+        c.execute(
+            """SELECT table_rows FROM information_schema.tables
+            WHERE table_schema = %s AND table_name = %s""",
+            (self.database, name))
+        row = c.fetchone()
+        c.close()
+
+        if row is None or row[0] is None:
+            return 0
+
+        return int(row[0])
+
+    def get_schema_fingerprint(self, name):
+        """
+        Returns the table's create_time with a checksum of its columns,
+        as ALTER TABLE without a table rebuild (e.g. INSTANT ADD COLUMN)
+        may keep the create_time.
+        Fingerprints of all tables are read with a single query.
+        """
+        if self._fingerprints is None:
+            c = self.get_cursor()
+            c.execute(
+                """SELECT t.table_name, t.create_time, COUNT(*),
+                    SUM(CRC32(CONCAT_WS(' ', c.ordinal_position,
+                        c.column_name, c.column_type, c.is_nullable,
+                        c.column_default, c.extra)))
+                FROM information_schema.tables t
+                JOIN information_schema.columns c
+                    ON c.table_schema = t.table_schema
+                    AND c.table_name = t.table_name
+                WHERE t.table_schema = %s
+                GROUP BY t.table_name, t.create_time""", (self.database,))
+
+            self._fingerprints = {}
+            for (table_name, create_time, columns, checksum) in c:
+                if create_time is not None:
+                    self._fingerprints[table_name] = "{0}:{1}:{2}".format(
+                        create_time, columns, checksum)
+
+            c.close()
+
+        return self._fingerprints.get(name)
+
+    def _get_schema_key(self, name):
+        return ("mysql", self.host, str(self.port), self.database, name)
 
     def get_tables_name_sql(self):
         """
@@ -1,11 +1,14 @@
 import core
+from loremdb.util import get_unique_text, get_scaled_number
+from hashlib import sha1
+import os
 
 
 class Table(core.Table):
 
-    def __init__(self, *args, **kargs):
-        super(Table, self).__init__(*args, **kargs)
-        self.__fields = None
+    # Rows of each batch in fast mode (commits, the error breaker, stops
+    # and progress are checked between batches)
+    fast_batch_size = 10000
 
     def _create_insert_sql(self):
         field_names = [i.get_name() for i in self._get_fields()]
@@ -15,13 +18,10 @@ class Table(core.Table):
             ", ".join([":{0}".format(i) for i in field_names])
         )
 
-    def _get_fields(self):
-        if self.__fields is not None:
-            return self.__fields
-
+    def _introspect_fields(self):
         c = self.get_cursor()
 
-        self.__fields = []
+        fields = []
 
         sql = "PRAGMA table_info({0})".format(self.name)
         for (num, name, f_type, _, _, _) in c.execute(sql):
@@ -38,9 +38,30 @@ class Table(core.Table):
             else:
                 raise Exception("Unexpected column type '{0}'".format(f_type))
 
-            self.__fields.append(field)
+            fields.append(field)
+
+        return fields
+
+    def fill(self, n=10, batch_size=None, *args, **kargs):
+        if self._database.fast and (batch_size is None or batch_size <= 1):
+            # Rows are generated while executemany() consumes them
+            batch_size = self.fast_batch_size
+
+        super(Table, self).fill(n, batch_size, *args, **kargs)
 
-        return self.__fields
+    def _insert_batch(self, cursor, sql, rows):
+        """
+        SQLite's executemany() keeps the rows inserted before a failure
+        and stops right after the failed row, so instead of retrying the
+        whole batch we resume from there.
+        """
+        rows = iter(rows)
+        while True:
+            try:
+                cursor.executemany(sql, rows)
+                return
+            except Exception, e:
+                self._insert_failed(e)
 
 
 class TypeAffinity(object):
@@ -80,6 +101,8 @@ class TypeAffinity(object):
 
 
 class IntegerField(core.Field):
+    unique_support = True
+
     def __init__(self, name, min, max):
         super(IntegerField, self).__init__(name)
         self.min = min
@@ -88,8 +111,28 @@ class IntegerField(core.Field):
     def _get_random_value(self):
         return self.content_gen.get_int(self.min, self.max)
 
+    def _compile(self, content_gen):
+        get_int = content_gen.get_int
+        start, end = self.min, self.max
+        return lambda: get_int(start, end)
+
+    def _get_random_values(self, n):
+        return self.content_gen.get_ints(self.min, self.max, n)
+
+    def get_unique_value(self, index):
+        # Unique integers aren't limited to min and max
+        return index + 1
+
+    def get_unique_start(self, max_value, rows):
+        if max_value is None:
+            return 0
+
+        return max(int(max_value), 0)
+
 
 class TextField(core.Field):
+    unique_support = True
+
     def __init__(self, name, length):
         super(TextField, self).__init__(name)
         self.length = length
@@ -97,6 +140,17 @@ class TextField(core.Field):
     def _get_random_value(self):
         return self.content_gen.get_text(self.length)
 
+    def _compile(self, content_gen):
+        get_text = content_gen.get_text
+        length = self.length
+        return lambda: get_text(length)
+
+    def _get_random_values(self, n):
+        return self.content_gen.get_texts(self.length, n)
+
+    def get_unique_value(self, index):
+        return get_unique_text(index, self.length)
+
 
 class NoneField(TextField):
     pass
@@ -107,33 +161,290 @@ class BlobField(TextField):
 
 
 class RealField(core.Field):
-    _range = 99999
+    # Values are in [0, 10 ** 5) with 5 decimals
+    precision = 10
+    scale = 5
+
+    unique_support = True
 
     def _get_random_value(self):
-        return float(
-            "{0}.{1}".format(
-                self.content_gen.get_int(0, self._range),
-                self.content_gen.get_int(0, self._range)
-            )
-        )
+        return self._compile(self.content_gen)()
+
+    def _compile(self, content_gen):
+        get_int = content_gen.get_int
+        end = 10 ** self.precision - 1
+        scaled = get_scaled_number(self.scale, as_float=True)
+        return lambda: scaled(get_int(0, end))
+
+    def _get_random_values(self, n):
+        end = 10 ** self.precision - 1
+        scaled = get_scaled_number(self.scale, as_float=True)
+        return map(scaled, self.content_gen.get_ints(0, end, n))
+
+    def get_unique_value(self, index):
+        return float(index + 1)
+
+    def get_unique_start(self, max_value, rows):
+        if max_value is None:
+            return 0
+
+        return max(int(max_value), 0)
 
 
 class DataBase(core.DataBase):
+    """
+    SQLite database.
+
+    With 'fast' all tables are filled in a single explicit transaction
+    with relaxed PRAGMAs (journal in memory, no syncs and a bigger page
+    cache). The original PRAGMAs are restored after filling.
+    A crash in the middle of a fast fill may corrupt the database file.
+
+    With 'rebuild_indexes', indexes of the filled tables are dropped
+    before filling and created again (in a single pass each) after it,
+    then the tables are analyzed. Unique indexes are kept, as they
+    enforce constraints while filling.
+    """
+
     _table_cls = Table
 
-    def __init__(self, content_gen, name, engine="sqlite3"):
+    # PRAGMAs changed in fast mode
+    # (the journal is kept in memory so failed inserts can be rolled back)
+    fast_pragmas = [
+        ("journal_mode", "MEMORY"),
+        ("synchronous", "OFF"),
+        ("cache_size", "-262144"),
+    ]
+
+    # SQLite's errors have no codes in the sqlite3 module
+    error_messages = [
+        ("UNIQUE constraint failed", "duplicate-key"),
+        ("is not unique", "duplicate-key"),
+        ("must be unique", "duplicate-key"),
+        ("FOREIGN KEY constraint failed", "foreign-key"),
+        ("NOT NULL constraint failed", "not-null"),
+        ("may not be NULL", "not-null"),
+        ("CHECK constraint failed", "check"),
+        ("constraint failed", "check"),
+        ("too big", "data-too-long"),
+        ("database is locked", "deadlock"),
+        ("disk I/O error", "connection-lost"),
+    ]
+
+    def __init__(self, content_gen, name, engine="sqlite3", fast=False,
+                 rebuild_indexes=False):
         super(DataBase, self).__init__(content_gen)
         self._engine = engine
         self._name = name
+        self.fast = fast
+        self.rebuild_indexes = rebuild_indexes
+        self._saved_pragmas = []
+        self._dropped_indexes = []
 
-    def get_conn(self):
-        if hasattr(self, '_conn'):
-            return self._conn
-
+    def _connect(self):
         eng = __import__(self._engine)
-        self._conn = eng.connect(self._name)
-        return self._conn
+        return eng.connect(self._name)
+
+    def _before_fill(self):
+        if self.rebuild_indexes:
+            self._drop_indexes()
+
+        if not self.fast:
+            return
+
+        self.commit()
+        c = self.get_cursor()
+        self._saved_pragmas = []
+        for name, value in self.fast_pragmas:
+            (old_value,) = c.execute("PRAGMA {0}".format(name)).fetchone()
+            self._saved_pragmas.append((name, old_value))
+            c.execute("PRAGMA {0} = {1}".format(name, value))
+
+        c.execute("BEGIN")
+        c.close()
+
+    def _after_fill(self):
+        if self.fast:
+            # Nothing is pending if the fill was committed
+            self.get_conn().rollback()
+
+            c = self.get_cursor()
+            for name, value in self._saved_pragmas:
+                c.execute("PRAGMA {0} = {1}".format(name, value))
+
+            c.close()
+            self._saved_pragmas = []
+
+        if self.rebuild_indexes:
+            self._create_dropped_indexes()
+
+    def _drop_indexes(self):
+        """
+        Drops the indexes (but unique ones) of the tables to fill,
+        their CREATE statements are kept to create them again.
+        Indexes made by constraints (without statement) are kept.
+        """
+        self.commit()
+        tables = self.get_tables()
+
+        c = self.get_cursor()
+        unique = set()
+        for table in tables:
+            sql = "PRAGMA index_list({0})".format(table)
+            unique.update([row[1] for row in c.execute(sql) if row[2]])
+
+        c.execute(
+            """SELECT name, tbl_name, sql FROM sqlite_master
+            WHERE type='index' AND sql IS NOT NULL""")
+        self._dropped_indexes = [
+            (name, create_sql)
+            for (name, table_name, create_sql) in c.fetchall()
+            if table_name in tables and name not in unique
+        ]
+
+        for name, _ in self._dropped_indexes:
+            c.execute('DROP INDEX "{0}"'.format(name))
+
+        c.close()
+        self.commit()
+
+    def _create_dropped_indexes(self):
+        """
+        Creates the indexes dropped by _drop_indexes() and analyzes the
+        filled tables
+        """
+        # Rows not committed (by a failed fill) aren't committed by
+        # CREATE INDEX
+        self.get_conn().rollback()
+
+        c = self.get_cursor()
+        c.execute("SELECT name FROM sqlite_master WHERE type='index'")
+        existing = set([name for (name,) in c.fetchall()])
+
+        for name, sql in self._dropped_indexes:
+            if name not in existing:
+                c.execute(sql)
+
+        for table in self.get_tables():
+            c.execute("ANALYZE {0}".format(table))
+
+        c.close()
+        self.commit()
+        self._dropped_indexes = []
+
+    def _query_foreign_keys(self):
+        """
+        Reads foreign keys with PRAGMA foreign_key_list, references
+        without parent columns are to the parent's primary key.
+        """
+        c = self.get_cursor()
+        c.execute(self.get_tables_name_sql())
+        tables = [name for (name,) in c]
+
+        foreign_keys = {}
+        for name in tables:
+            keys = {}
+            sql = "PRAGMA foreign_key_list({0})".format(name)
+            for row in c.execute(sql):
+                (fk_id, seq, parent, column, parent_column) = row[:5]
+                keys.setdefault(fk_id, (parent, []))[1].append(
+                    (seq, column, parent_column))
+
+            for fk_id in sorted(keys):
+                parent, columns = keys[fk_id]
+                columns.sort()
+                parent_columns = [i[2] for i in columns]
+                if None in parent_columns:
+                    parent_columns = self._get_primary_key(parent)
+
+                foreign_keys.setdefault(name, []).append(core.ForeignKey(
+                    tuple([i[1] for i in columns]), parent,
+                    tuple(parent_columns)))
+
+        c.close()
+
+        return foreign_keys
+
+    def _query_unique_keys(self):
+        """
+        Reads unique indexes with PRAGMA index_list and index_info,
+        plus the primary key (an INTEGER PRIMARY KEY has no index).
+        """
+        c = self.get_cursor()
+        c.execute(self.get_tables_name_sql())
+        tables = [name for (name,) in c]
+
+        unique_keys = {}
+        for name in tables:
+            keys = []
+            primary_key = tuple(self._get_primary_key(name))
+            if len(primary_key) > 0:
+                keys.append(primary_key)
+
+            sql = "PRAGMA index_list({0})".format(name)
+            indexes = [row[1] for row in c.execute(sql) if row[2]]
+            for index in indexes:
+                sql = "PRAGMA index_info({0})".format(index)
+                key = tuple([column for (_, _, column)
+                             in sorted(c.execute(sql).fetchall())])
+                if key not in keys and None not in key:
+                    keys.append(key)
+
+            if len(keys) > 0:
+                unique_keys[name] = keys
+
+        c.close()
+
+        return unique_keys
+
+    def _get_primary_key(self, table):
+        c = self.get_cursor()
+        columns = [
+            (pk, name) for (_, name, _, _, _, pk)
+            in c.execute("PRAGMA table_info({0})".format(table)) if pk > 0
+        ]
+        c.close()
+
+        return [name for _, name in sorted(columns)]
+
+    def count_rows(self, name):
+        """
+        Returns the greatest rowid of the table 'name' (its number of
+        rows, unless rows were deleted) without scanning it
+        """
+        c = self.get_cursor()
+        try:
+            c.execute("SELECT MAX(rowid) FROM {0}".format(name))
+        except Exception:
+            # Tables WITHOUT ROWID are counted
+            c.execute("SELECT COUNT(*) FROM {0}".format(name))
+
+        (rows,) = c.fetchone()
+        c.close()
+
+        return int(rows or 0)
+
+    def get_schema_fingerprint(self, name):
+        """
+        Returns a checksum of the table's CREATE statement
+        """
+        c = self.get_cursor()
+        c.execute(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND name=?",
+            (name,))
+        row = c.fetchone()
+        c.close()
+
+        if row is None or row[0] is None:
+            return None
+
+        return sha1(row[0].encode("utf-8")).hexdigest()
+
+    def _get_schema_key(self, name):
+        return ("sqlite", os.path.abspath(self._name), name)
 
     def get_tables_name_sql(self):
         """Returns a query with table's name in the first column"""
-        return "SELECT name FROM sqlite_master WHERE type='table'"
+        # Internal tables (e.g. sqlite_stat1, made by ANALYZE) aren't filled
+        return ("SELECT name FROM sqlite_master WHERE type='table' "
+                "AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'")
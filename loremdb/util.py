@@ -1,5 +1,7 @@
 import random
+import hashlib
 from datetime import date, timedelta, datetime
+from decimal import Decimal
 import re
 from os import linesep
 
@@ -49,16 +51,141 @@ _phrases = [
     "Vestibulum eget erat et dui sollicitudin semper",
 ]
 
+# Length of the longest text returned by ContentGen.get_text()
+max_text_len = max([len(i) for i in _phrases])
+
+_base36_digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def get_unique_text(index, max_len):
+    """
+    Returns a text different for each 'index' (a phrase followed by
+    'index' in base 36), not longer than 'max_len' or max_text_len.
+    Texts only differ while 'index' fits in 'max_len' base 36 digits.
+    """
+    phrase = _phrases[index % len(_phrases)]
+    suffix = ""
+    while True:
+        index, digit = divmod(index, 36)
+        suffix = _base36_digits[digit] + suffix
+        if index == 0:
+            break
+
+    max_len = min(max_len, max_text_len)
+    if len(suffix) >= max_len:
+        return suffix[len(suffix) - max_len:]
+
+    return phrase[:max_len - len(suffix) - 1] + " " + suffix
+
+
+# Dates and 'YYYY-MM-DD ' texts of each pair of bounds
+_date_tables = {}
+_date_text_tables = {}
+
+# 'HH:MM' of each minute of a day and ':SS' of each second of a minute
+_minute_texts = [
+    "{0:02d}:{1:02d}".format(*divmod(i, 60)) for i in xrange(1440)
+]
+_second_texts = [":{0:02d}".format(i) for i in xrange(60)]
+
+
+def get_date_table(start, end):
+    """
+    Returns the list of days from 'start' to 'end' (both included),
+    built once for each pair of bounds.
+    """
+    key = (start, end)
+    dates = _date_tables.get(key)
+    if dates is None:
+        dates = [start + timedelta(i) for i in xrange((end - start).days + 1)]
+        _date_tables[key] = dates
+
+    return dates
+
+
+def get_date_texts(start, end):
+    """
+    Returns the days of get_date_table() as 'YYYY-MM-DD ' texts
+    (followed by a space, to be joined with a time)
+    """
+    key = (start, end)
+    texts = _date_text_tables.get(key)
+    if texts is None:
+        texts = [i.isoformat() + " " for i in get_date_table(start, end)]
+        _date_text_tables[key] = texts
+
+    return texts
+
+
+def get_scaled_number(scale, as_float=False):
+    """
+    Returns a function turning an integer 'k' into k * 10 ** -scale,
+    an exact Decimal (with 'scale' digits) or a float with 'as_float'.
+    Ex: get_scaled_number(2)(-1234) == Decimal("-12.34")
+    """
+    if as_float:
+        divisor = float(10 ** scale)
+        return lambda k: k / divisor
+
+    # The exponent keeps the digits of the scale (e.g. 5E-2 is 0.05)
+    text = "%dE-" + str(scale)
+    return lambda k: Decimal(text % k)
+
 
 class ContentGen(object):
-    """Content generator with 'Loren ipsum' texts and random numbers"""
+    """
+    Content generator with 'Loren ipsum' texts and random numbers.
+
+    With a 'seed', derive() returns generators that depend only
+    on the seed and the given keys.
+
+    Methods in plural (get_ints(), get_texts(), ...) return lists of
+    'n' values, see NumpyContentGen for a vectorized implementation.
+    """
+
+    # True if batch methods are faster than their single value versions
+    vectorized = False
+
+    # True if values can be generated for any position, see seek()
+    counter_based = False
+
+    def __init__(self, random_instance=None, seed=None):
+        self.seed = seed
 
-    def __init__(self, random_instance=None):
         if random_instance is not None:
             self._random = random_instance
+        elif seed is not None:
+            self._random = self._create_random(seed)
         else:
             self._random = random.Random()
 
+    def spawn(self):
+        """
+        Returns a new (independent) generator seeded by this one
+        """
+        if self.seed is not None:
+            return self.__class__(seed=self.seed)
+
+        return self.__class__(random.Random(self._random.getrandbits(64)))
+
+    def derive(self, *keys):
+        """
+        Returns a new generator seeded by this generator's seed and 'keys'
+        """
+        return self.__class__(self._create_random(self.seed, *keys))
+
+    def _create_random(self, *keys):
+        # A digest, unlike hash(), is the same on every platform
+        key = u":".join([unicode(i) for i in keys]).encode("utf-8")
+        return random.Random(long(hashlib.sha1(key).hexdigest(), 16))
+
+    def get_random_function(self):
+        """
+        Returns a function without arguments returning floats in [0, 1)
+        (it's bound once by hot loops, see core.Field.compile())
+        """
+        return self._random.random
+
     def get_text(self, max_len):
         phrase = self.get_in_list(_phrases)
 
@@ -81,13 +208,16 @@ class ContentGen(object):
         return self._random.uniform(float(start), float(end))
 
     def get_date(self, start=None, end=None):
+        dates = get_date_table(*self._get_date_bounds(start, end))
+        return dates[self.get_int(0, len(dates) - 1)]
+
+    def _get_date_bounds(self, start, end):
         if start is None:
             start = self._get_default_start_date()
 
         end = end if end is not None else self._get_default_end_date()
 
-        td_diff = end - start if start <= end else start - end
-        return start + timedelta(self.get_int(0, td_diff.days))
+        return (start, end) if start <= end else (end, start)
 
     def _get_default_start_date(self):
         return date(2006, 1, 1)
@@ -96,17 +226,82 @@ class ContentGen(object):
         return date(2020, 1, 1)
 
     def get_datetime(self, start=None, end=None):
+        start, seconds = self._get_datetime_bounds(start, end)
+        return start + timedelta(0, self.get_int(0, seconds))
+
+    def get_datetime_text(self, start=None, end=None):
+        """
+        Returns a datetime as 'YYYY-MM-DD HH:MM:SS' (see get_datetime()),
+        made of precomputed texts.
+        """
+        texts, first, seconds = self._get_datetime_texts(start, end)
+        return texts(first + self.get_int(0, seconds))
+
+    def get_date_function(self, start=None, end=None):
+        """
+        Returns a function without arguments returning dates like
+        get_date(), with the bounds resolved once (for hot loops)
+        """
+        dates = get_date_table(*self._get_date_bounds(start, end))
+        draw, size = self.get_random_function(), len(dates)
+        return lambda: dates[int(draw() * size)]
+
+    def get_datetime_text_function(self, start=None, end=None):
+        """
+        Returns a function without arguments returning texts like
+        get_datetime_text(), with the bounds resolved once
+        """
+        texts, first, seconds = self._get_datetime_texts(start, end)
+        draw, size = self.get_random_function(), seconds + 1
+        return lambda: texts(first + int(draw() * size))
+
+    def _get_datetime_bounds(self, start, end):
+        """
+        Returns the earliest bound and the seconds until the other one
+        """
         if start is None:
             start = self._get_default_start_datetime()
 
         if end is None:
             end = self._get_default_end_datetime()
 
-        td_diff = end - start if start <= end else start - end
-        return start + timedelta(
-            self.get_int(0, td_diff.days),
-            self.get_int(0, td_diff.seconds)
-        )
+        if start > end:
+            start, end = end, start
+
+        diff = end - start
+        return start, diff.days * 86400 + diff.seconds
+
+    def _get_datetime_texts(self, start, end):
+        """
+        Returns a function turning a second since the first bound's day
+        into a text, that second for the first bound and the seconds
+        between bounds.
+        """
+        start, seconds = self._get_datetime_bounds(start, end)
+        first = start.hour * 3600 + start.minute * 60 + start.second
+        end = start + timedelta(0, seconds)
+        dates = get_date_texts(start.date(), end.date())
+
+        def texts(second):
+            days, second = divmod(second, 86400)
+            minutes, second = divmod(second, 60)
+            return dates[days] + _minute_texts[minutes] + \
+                _second_texts[second]
+
+        return texts, first, seconds
+
+    def get_time_text(self):
+        """
+        Returns a time of the day as 'HH:MM:SS'
+        """
+        minutes, second = divmod(self.get_int(0, 86399), 60)
+        return _minute_texts[minutes] + _second_texts[second]
+
+    def get_time_text_function(self):
+        draw = self.get_random_function()
+        minutes, seconds = _minute_texts, _second_texts
+        return lambda: minutes[int(draw() * 1440)] + \
+            seconds[int(draw() * 60)]
 
     def _get_default_start_datetime(self):
         return datetime(2006, 1, 1, 0, 0, 0)
@@ -117,6 +312,212 @@ class ContentGen(object):
     def get_int(self, start, end):
         return self._random.randint(start, end)
 
+    def get_ints(self, start, end, n):
+        randint = self._random.randint
+        return [randint(start, end) for i in xrange(n)]
+
+    def get_randoms(self, n):
+        """
+        Returns 'n' floats in [0, 1)
+        """
+        draw = self._random.random
+        return [draw() for i in xrange(n)]
+
+    def get_texts(self, max_len, n):
+        phrases = self.get_in_lists(_phrases, n)
+        cuts = self.get_ints(1, max(max_len, 1), n)
+
+        return [
+            phrase if len(phrase) <= max_len else phrase[0:cut]
+            for phrase, cut in zip(phrases, cuts)
+        ]
+
+    def get_in_lists(self, list, n):
+        """
+        Returns 'n' items of 'list'
+        """
+        return [list[i] for i in self.get_ints(0, len(list) - 1, n)]
+
+    def get_dates(self, n, start=None, end=None):
+        dates = get_date_table(*self._get_date_bounds(start, end))
+        return [dates[i] for i in self.get_ints(0, len(dates) - 1, n)]
+
+    def get_datetimes(self, n, start=None, end=None):
+        start, seconds = self._get_datetime_bounds(start, end)
+        return [
+            start + timedelta(0, i) for i in self.get_ints(0, seconds, n)
+        ]
+
+    def get_datetime_texts(self, n, start=None, end=None):
+        texts, first, seconds = self._get_datetime_texts(start, end)
+        return map(texts, self.get_ints(first, first + seconds, n))
+
+    def get_time_texts(self, n):
+        return [
+            _minute_texts[i // 60] + _second_texts[i % 60]
+            for i in self.get_ints(0, 86399, n)
+        ]
+
+
+_mask64 = 2 ** 64 - 1
+
+
+def _mix64(x):
+    """
+    SplitMix64's mixing function (a bijection of 64 bits integers)
+    """
+    x = (x + 0x9E3779B97F4A7C15) & _mask64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _mask64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _mask64
+    return x ^ (x >> 31)
+
+
+class CounterRandom(random.Random):
+    """
+    Random whose n-th number is a hash of a key and n (a SplitMix64
+    stream), so it can be moved to any key without replaying numbers.
+    Ex:
+    r = CounterRandom(42)
+    r.seek(10, 2) # Numbers of the cell at row 10 and column 2
+    r.random()
+    """
+
+    def __init__(self, key=0):
+        self._base = 0
+        self._key = 0
+        self._counter = 0
+        super(CounterRandom, self).__init__(key)
+
+    def seed(self, key=None):
+        if key is None:
+            key = random.getrandbits(64)
+
+        self._base = self._key = long(key) & _mask64
+        self._counter = 0
+
+    def seek(self, row, column=0):
+        """
+        Restarts the numbers at a key derived from 'row' and 'column'
+        """
+        self._key = _mix64(_mix64(self._base ^ row) ^ column)
+        self._counter = 0
+
+    def _next(self):
+        self._counter += 1
+        return _mix64(self._key + self._counter * 0x9E3779B97F4A7C15)
+
+    def random(self):
+        return (self._next() >> 11) * (1.0 / 2 ** 53)
+
+    def getrandbits(self, k):
+        value = 0
+        bits = 0
+        while bits < k:
+            value = (value << 64) | self._next()
+            bits += 64
+
+        return value >> (bits - k)
+
+    def getstate(self):
+        return (self._base, self._key, self._counter)
+
+    def setstate(self, state):
+        self._base, self._key, self._counter = state
+
+    def jumpahead(self, n):
+        self._counter += n
+
+
+class CounterContentGen(ContentGen):
+    """
+    ContentGen whose values depend only on the seed, the keys given to
+    derive() and the position given to seek(), e.g. a row and a column
+    of a table, so any row can be generated without the previous ones.
+    """
+
+    counter_based = True
+
+    def _create_random(self, *keys):
+        key = u":".join([unicode(i) for i in keys]).encode("utf-8")
+        return CounterRandom(long(hashlib.sha1(key).hexdigest()[:16], 16))
+
+    def spawn(self):
+        if self.seed is not None:
+            return self.__class__(seed=self.seed)
+
+        return self.__class__(CounterRandom(self._random.getrandbits(64)))
+
+    def seek(self, row, column=0):
+        """
+        Moves the generator to the values of 'row' and 'column'
+        """
+        self._random.seek(row, column)
+
+
+class NumpyContentGen(ContentGen):
+    """
+    ContentGen whose batch methods draw whole arrays with NumPy
+    (an optional dependency, ImportError is raised without it).
+    Single value methods are the same of ContentGen.
+    """
+
+    vectorized = True
+
+    # Biggest value of a signed 64 bits integer
+    _int64_max = 2 ** 63 - 1
+
+    def __init__(self, random_instance=None, seed=None):
+        import numpy
+
+        super(NumpyContentGen, self).__init__(random_instance, seed)
+        self._numpy = numpy
+        self._numpy_random = numpy.random.RandomState(
+            [self._random.getrandbits(32) for i in xrange(4)]
+        )
+
+    def get_ints(self, start, end, n):
+        span = end - start
+        if span < self._int64_max and start >= -self._int64_max \
+                and end <= self._int64_max:
+            values = self._numpy_random.randint(
+                0, span + 1, size=n, dtype=self._numpy.int64)
+            return (values + start).tolist()
+
+        return [start + i for i in self._get_big_ints(span, n)]
+
+    def _get_big_ints(self, end, n):
+        """
+        Returns 'n' ints in [0, end] for ranges too big for int64 (e.g.
+        unsigned bigint or DECIMAL(30)): each value is made of as many
+        uint64 words as bits 'end' has, and it's drawn again if greater
+        than 'end', so values are uniform.
+        """
+        bits = end.bit_length()
+        words = -(-bits // 64)
+        shift = words * 64 - bits
+
+        values = []
+        while len(values) < n:
+            columns = [
+                self._numpy_random.randint(
+                    0, 2 ** 64, size=n - len(values),
+                    dtype=self._numpy.uint64).tolist()
+                for i in xrange(words)
+            ]
+            for row in zip(*columns):
+                value = 0
+                for word in row:
+                    value = value << 64 | word
+
+                value >>= shift
+                if value <= end:
+                    values.append(value)
+
+        return values
+
+    def get_randoms(self, n):
+        return self._numpy_random.random_sample(n).tolist()
+
 
 class OptionsParser(object):
     """
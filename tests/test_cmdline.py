@@ -1,62 +1,196 @@
 import unittest
 import loremdb.cmdline
+from datetime import datetime
 from os import linesep
+import json
+import os
+from StringIO import StringIO
 
 
-class testOutputProgress(unittest.TestCase):
+class testProgressRenderer(unittest.TestCase):
 
-    output = []
+    table_info = {"name": "users"}
 
     def setUp(self):
-        self.output = []
-        self.obj = loremdb.cmdline.OutputProgress(500, self.callback)
+        self.now = 0.0
+        self.stream = StringIO()
+        self.obj = loremdb.cmdline.ProgressRenderer(
+            1000, self.stream, self.clock, tty=True)
+
+    def clock(self):
+        return self.now
+
+    def test_start_table(self):
+        self.obj.start_table(self.table_info)
+        self.assertEquals("Populating 'users'" + linesep,
+                          self.stream.getvalue())
+
+    def test_resumed_table(self):
+        self.obj.start_table(self.table_info, 500)
+        self.stream.truncate(0)
+
+        self.now = 1.0
+        self.obj.update(self.table_info, 100)
+
+        self.assertEquals(
+            "\r'users': 600/1000 (60%), 100 rows/s (avg 100),"
+            " ETA 0:00:04, 0.0% errors, elapsed 0:00:01",
+            self.stream.getvalue()
+        )
+
+    def test_table_with_own_total(self):
+        self.obj.start_table(self.table_info, 0, 200)
+        self.stream.truncate(0)
+
+        self.now = 1.0
+        self.obj.update(self.table_info, 100)
+
+        self.assertEquals(
+            "\r'users': 100/200 (50%), 100 rows/s (avg 100),"
+            " ETA 0:00:01, 0.0% errors, elapsed 0:00:01",
+            self.stream.getvalue()
+        )
 
-    def callback(self, to_print):
-        self.output.append(to_print)
+    def test_draw(self):
+        self.obj.start_table(self.table_info)
+        self.stream.truncate(0)
 
-    def test_simple_dot_print(self):
-        self.obj()
-        self.assertEquals(["."], self.output)
+        self.now = 1.0
+        self.obj.update(self.table_info, 100, 10)
 
-    def test_line_break(self):
-        for i in range(49):
-            self.obj()
+        self.assertEquals(
+            "\r'users': 100/1000 (10%), 100 rows/s (avg 100),"
+            " ETA 0:00:09, 10.0% errors, elapsed 0:00:01",
+            self.stream.getvalue()
+        )
 
-        test_list = ["." for __ in range(49)]
-        self.assertEquals(test_list, self.output)
+    def test_draw_interval(self):
+        self.obj.start_table(self.table_info)
 
-        # Adding two dots
-        self.obj()
-        self.obj()
-        test_list += [".", " 10%", linesep, "."]
+        self.now = 1.0
+        self.obj.update(self.table_info, 100)
+        self.stream.truncate(0)
 
-        self.assertEquals(test_list, self.output)
+        # Too soon to draw again
+        self.now = 1.1
+        self.obj.update(self.table_info, 100)
+        self.assertEquals("", self.stream.getvalue())
 
-        # Completing another line
-        for i in range(49):
-            self.obj()
+        self.now = 1.25
+        self.obj.update(self.table_info, 100)
+        self.assertTrue(self.stream.getvalue().startswith(
+            "\r'users': 300/1000 (30%)"))
 
-        test_list += ["." for __ in range(49)] + [" 20%", linesep]
-        self.assertEquals(test_list, self.output)
+    def test_current_rate(self):
+        self.obj.start_table(self.table_info)
 
-    def test_reset(self):
-        for i in range(49):
-            self.obj()
+        for i in range(1, 6):
+            self.now = float(i)
+            self.obj.update(self.table_info, 50 * i)
 
-        test_list = ["." for __ in range(49)]
-        self.assertEquals(test_list, self.output)
+        # Last 2 seconds: 450 rows, average: 750 rows in 5 seconds
+        self.assertTrue(
+            "225 rows/s (avg 150)" in self.stream.getvalue().split("\r")[-1])
 
-        # Reseting
-        self.output = []
-        self.obj.reset()
+    def test_finished_table(self):
+        self.obj.start_table(self.table_info)
 
-        self.obj()
-        self.assertEquals(["."], self.output)
+        self.now = 0.5
+        self.obj.update(self.table_info, 500)
 
-    def test_call_overflow(self):
-        self.obj.progress_size = 30
+        self.now = 2.0
+        self.obj.update(self.table_info, 500)
+        self.obj.finish_table(self.table_info)
 
-        for i in range(30):
-            self.obj()
+        self.assertTrue(self.stream.getvalue().endswith(
+            "\r'users': 1000 rows in 0:00:02, 500 rows/s, 0.0% errors" +
+            linesep
+        ))
 
-        self.assertRaises(StandardError, self.obj)
+    def test_stopped_table(self):
+        self.obj.start_table(self.table_info)
+
+        self.now = 2.0
+        self.obj.update(self.table_info, 300, 30)
+        self.obj.finish_table(self.table_info)
+
+        # Abandoned or interrupted tables get their summary too
+        self.assertTrue(self.stream.getvalue().endswith(
+            "\r'users': 300 rows in 0:00:02, 150 rows/s, 10.0% errors" +
+            linesep
+        ))
+
+    def test_not_tty(self):
+        self.obj = loremdb.cmdline.ProgressRenderer(
+            1000, self.stream, self.clock)
+        self.obj.start_table(self.table_info)
+
+        self.now = 1.0
+        self.obj.update(self.table_info, 100)
+
+        # Until 'log_interval' seconds nothing is written
+        self.now = 5.0
+        self.obj.update(self.table_info, 100)
+
+        self.now = 11.0
+        self.obj.update(self.table_info, 100)
+
+        lines = self.stream.getvalue().split(linesep)
+        self.assertEquals(4, len(lines))
+        self.assertFalse("\r" in self.stream.getvalue())
+        self.assertTrue(lines[1].startswith("'users': 100/1000 (10%)"))
+        self.assertTrue(lines[2].startswith("'users': 300/1000 (30%)"))
+
+    def test_more_rows_than_expected(self):
+        self.obj.start_table(self.table_info)
+        self.obj.update(self.table_info, 1000)
+        self.obj.update(self.table_info, 10)
+
+
+class testLoremDb(unittest.TestCase):
+
+    manifest_path = "/tmp/loremdb-unittest-manifest"
+
+    def setUp(self):
+        self.obj = loremdb.cmdline.LoremDb()
+
+    def tearDown(self):
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def validate(self, manifest, *args):
+        with open(self.manifest_path, "w") as f:
+            json.dump(manifest, f)
+
+        self.obj.options = self.obj._parser.parse_args(
+            ["-d", "sqlite", "--manifest", self.manifest_path] + list(args))
+        self.obj._validate_args()
+        return self.obj.options
+
+    def test_manifest(self):
+        options = self.validate({
+            "users": 10,
+            "orders": {
+                "rows": 20,
+                "columns": {"created": {"start": "2015-01-01",
+                                        "end": "2016-12-31 23:59:59"}},
+            },
+            "sections": {"columns": {"day": {"end": "2000-01-01"}}},
+        }, "--rows", "users=5")
+
+        self.assertEquals({"users": 5, "orders": 20}, options.row_targets)
+        self.assertEquals({
+            "orders": {"created": {
+                "start": datetime(2015, 1, 1),
+                "end": datetime(2016, 12, 31, 23, 59, 59),
+            }},
+            "sections": {"day": {"end": datetime(2000, 1, 1)}},
+        }, options.column_options)
+
+    def test_manifest_with_invalid_bounds(self):
+        self.assertRaises(
+            loremdb.cmdline.ArgumentError, self.validate,
+            {"users": {"columns": {"birth": {"start": "28/08/1990"}}}})
+        self.assertRaises(
+            loremdb.cmdline.ArgumentError, self.validate,
+            {"users": {"columns": {"birth": {"length": 10}}}})
@@ -4,6 +4,7 @@ from loremdb.util import ContentGen
 from random import Random
 from abc import ABCMeta, abstractmethod
 from datetime import date, datetime
+from decimal import Decimal
 
 
 class DataBaseTestCase(unittest.TestCase):
@@ -37,6 +38,7 @@ class TestDataBase(DataBaseTestCase):
         super(TestDataBase, self).setUp()
         self.signal_calls = []
         self.signal_calls_counter = 0
+        self.signal_errors_counter = 0
 
     def test_fill(self):
         c = self.database.get_cursor()
@@ -64,6 +66,40 @@ class TestDataBase(DataBaseTestCase):
 
         self.assertTrue("users" in tables)
 
+    def test_get_columns(self):
+        self.database.filter("sections")
+
+        self.assertEquals(["sections"], self.database.get_tables())
+
+        columns = self.database.get_columns("sections")
+        self.assertTrue(len(columns) > 0)
+        self.assertEquals(
+            range(1, len(columns) + 1),
+            [int(i["ordinal_position"]) for i in columns]
+        )
+
+        # Columns of tables out of the filter are read on demand
+        self.assertTrue(len(self.database.get_columns("users")) > 0)
+
+    def test_get_tables_without_columns(self):
+        self.database.get_tables()
+
+        # Columns are only read to introspect tables
+        self.assertEquals(None, self.database._columns)
+
+    def test_schema_fingerprint_changes_with_columns(self):
+        fingerprint = self.database.get_schema_fingerprint("sections")
+
+        c = self.database.get_cursor()
+        c.execute("ALTER TABLE sections ADD COLUMN note varchar(10)")
+        try:
+            self.database._fingerprints = None
+            self.assertNotEquals(
+                fingerprint, self.database.get_schema_fingerprint("sections"))
+        finally:
+            c.execute("ALTER TABLE sections DROP COLUMN note")
+            c.close()
+
     def test_filter(self):
         c = self.database.get_cursor()
 
@@ -86,14 +122,45 @@ class TestDataBase(DataBaseTestCase):
         self.database.filter("flunfla")
         self.assertRaises(Exception, self.database.fill, 10)
 
+    def test_fill_with_load_data(self):
+        database = mysql.DataBase(
+            ContentGen(),
+            user="root",
+            database="loremdb_test",
+            strategy="load-data"
+        )
+
+        database.on_insert_error.register(self.signal_callback_on_error)
+        database.filter("sections")
+        database.fill(n=10)
+
+        c = database.get_cursor()
+        c.execute("SELECT * from sections")
+        self.assertEquals(10, len(c.fetchall()) + self.signal_errors_counter)
+        c.close()
+
+    def test_fill_with_bulk_session(self):
+        self.database.bulk_session = True
+        self.database.fill(n=10)
+
+        c = self.database.get_cursor()
+        c.execute("SELECT * from users")
+        self.assertEquals(10, len(c.fetchall()))
+
+        # Session variables are restored
+        c.execute("SELECT @@session.foreign_key_checks, "
+                  "@@session.unique_checks")
+        self.assertEquals((1, 1), c.fetchone())
+        c.close()
+
     def test_signal_on_change_table(self):
         self.database.on_change_table.register(self.signal_callback)
 
         self.database.fill(10)
 
         result = [
-            {"name": "sections"},
-            {"name": "users"},
+            {"name": "sections", "start": 0},
+            {"name": "users", "start": 0},
         ]
 
         self.assertEquals(result, self.signal_calls)
@@ -110,6 +177,9 @@ class TestDataBase(DataBaseTestCase):
     def signal_callback_on_insert(self):
         self.signal_calls_counter += 1
 
+    def signal_callback_on_error(self, e):
+        self.signal_errors_counter += 1
+
 
 class TestTable(DataBaseTestCase):
 
@@ -118,6 +188,7 @@ class TestTable(DataBaseTestCase):
         self.table = mysql.Table(self.database, "users", ContentGen())
         self.table.show_errors = False
         self.signal_calls_counter = 0
+        self.errors_counter = 0
 
     def test_fill(self):
         c = self.table.get_cursor()
@@ -131,6 +202,49 @@ class TestTable(DataBaseTestCase):
         c.execute("SELECT * from users")
         self.assertEquals(10, len(c.fetchall()))
 
+    def test_fill_with_batch_size(self):
+        self.table.on_insert.register(self.signal_callback)
+        self.table.on_insert_error.register(self.error_callback)
+
+        self.table.fill(n=25, batch_size=10)
+        self.database.commit()
+
+        c = self.table.get_cursor()
+        c.execute("SELECT * from users")
+        self.assertEquals(25, len(c.fetchall()) + self.errors_counter)
+        self.assertEquals(25, self.signal_calls_counter)
+
+    def test_create_multi_row_insert_sql(self):
+        sql = self.table._create_insert_sql(2)
+        self.assertTrue(sql.startswith("INSERT INTO users (id, first_name"))
+        self.assertEquals(2, sql.count("(%s, %s, %s, %s, %s, %s, %s)"))
+
+    def test_fill_prepared(self):
+        self.database.prepared = True
+        self.table.on_insert_error.register(self.error_callback)
+
+        self.table.fill(n=10)
+        self.table.fill(n=25, batch_size=10)
+        self.database.commit()
+
+        c = self.table.get_cursor()
+        c.execute("SELECT * from users")
+        self.assertEquals(35, len(c.fetchall()) + self.errors_counter)
+
+    def test_prepared_insert_sql(self):
+        self.database.prepared = True
+        sql = self.table._get_insert_sql(2)
+        self.assertEquals(2, sql.count("(?, ?, ?, ?, ?, ?, ?)"))
+
+    def test_rows_per_statement(self):
+        header = len(self.table._create_insert_sql(0))
+        self.database.get_max_allowed_packet = \
+            lambda: header + self.table.packet_margin + 1000
+
+        # id(5) + first_name(27) + last_name(27) + age(4) + sex(14)
+        # + roles(22) + creation_date(12), plus separators: 129 bytes
+        self.assertEquals(7, self.table._get_rows_per_statement())
+
     def test_signal(self):
         self.table.on_insert.register(self.signal_callback)
 
@@ -141,6 +255,9 @@ class TestTable(DataBaseTestCase):
     def signal_callback(self):
         self.signal_calls_counter += 1
 
+    def error_callback(self, e):
+        self.errors_counter += 1
+
     def test_get_table_info(self):
         self.assertEquals(
             {"name": "users"},
@@ -148,6 +265,140 @@ class TestTable(DataBaseTestCase):
         )
 
 
+class FakeCursor(object):
+    """
+    Cursor loading (or inserting) 'loaded' rows, with the warnings and
+    the server variables given
+    """
+
+    def __init__(self, loaded, warnings, variables=[]):
+        self.rowcount = -1
+        self.statements = []
+        self._loaded = loaded
+        self._warnings = warnings
+        self._variables = variables
+        self._results = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql.split(" ")[:2])
+        if sql.startswith("LOAD DATA") or sql.startswith("INSERT"):
+            self.rowcount = self._loaded
+        elif sql.startswith("SHOW WARNINGS"):
+            self._results = self._warnings
+        elif sql.startswith("SHOW VARIABLES"):
+            self._results = self._variables
+        elif sql.startswith("SELECT"):
+            self._results = [(self._loaded,)]
+
+    def fetchone(self):
+        return self._results[0]
+
+    def fetchall(self):
+        return list(self._results)
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        return iter(self._results)
+
+
+class FakeConnection(object):
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+class BrokenValue(object):
+    def __str__(self):
+        raise ValueError("Broken value")
+
+
+class FakeCursorTableTestCase(unittest.TestCase):
+    """
+    Table of a database without connection, used with FakeCursor
+    """
+    strategy = "insert"
+
+    def setUp(self):
+        database = mysql.DataBase(
+            ContentGen(), user="root", database="loremdb_test",
+            strategy=self.strategy)
+        self.table = mysql.Table(database, "users", ContentGen())
+        self.table._fields = [mysql.IntField("id")]
+        self.table.on_insert_error.register(self.error_callback)
+        self.errors = []
+
+    def error_callback(self, e):
+        self.errors.append(e)
+
+
+class TestTableLoadData(FakeCursorTableTestCase):
+    strategy = "load-data"
+
+    def test_skipped_rows_get_their_warnings(self):
+        cursor = FakeCursor(2, [
+            ("Warning", 1265, "Data truncated for column 'id' at row 1"),
+            ("Warning", 1062, "Duplicate entry '3' for key 'PRIMARY'"),
+        ])
+        self.table._load_data(cursor, [[1], [2], [3]])
+
+        self.assertEquals([1062], [i.code for i in self.errors])
+
+    def test_row_not_written_is_failed(self):
+        cursor = FakeCursor(0, [])
+        self.table._load_data(cursor, iter([[1], [BrokenValue()], [3]]))
+
+        self.assertEquals(3, len(self.errors))
+
+
+class TestTableNonTransactional(FakeCursorTableTestCase):
+    def setUp(self):
+        super(TestTableNonTransactional, self).setUp()
+        self.table._database._engines = {"users": "MyISAM"}
+        self.table._Table__rows_per_statement = 3
+
+    def test_failed_rows_are_skipped(self):
+        cursor = FakeCursor(2, [
+            ("Warning", 1062, "Duplicate entry '3' for key 'PRIMARY'"),
+        ])
+        self.table._insert_batch(cursor, None, [[1], [2], [3]])
+
+        # Rows aren't inserted again
+        self.assertEquals(
+            [["INSERT", "IGNORE"], ["SHOW", "WARNINGS"]], cursor.statements)
+        self.assertEquals([1062], [i.code for i in self.errors])
+
+
+class TestDataBaseCountRows(FakeCursorTableTestCase):
+    def count_rows(self, variables):
+        cursor = FakeCursor(10, [], variables)
+        database = self.table._database
+        database._local.conn = FakeConnection(cursor)
+
+        self.assertEquals(10, database.count_rows("users"))
+        self.assertEquals(10, database.count_rows("users"))
+        return cursor.statements
+
+    def test_stats_expiry_is_set_once(self):
+        statements = self.count_rows(
+            [("information_schema_stats_expiry", "86400")])
+
+        self.assertEquals(
+            [["SHOW", "VARIABLES"], ["SET", "SESSION"],
+             ["SELECT", "table_rows"], ["SELECT", "table_rows"]],
+            statements)
+
+    def test_stats_expiry_without_the_variable(self):
+        statements = self.count_rows([])
+
+        self.assertEquals(
+            [["SHOW", "VARIABLES"], ["SELECT", "table_rows"],
+             ["SELECT", "table_rows"]], statements)
+
+
 class TestFieldCreatorFromMysql(unittest.TestCase):
     def setUp(self):
         self.creator = mysql.FieldCreatorFromMysql()
@@ -199,21 +450,40 @@ class TestFieldCreatorFromMysql(unittest.TestCase):
         self.assertEquals("some_options", field.name)
         self.assertEquals(["a", "b", "c"], field.options)
 
+    def test_create_date_field_with_bounds(self):
+        self.default_row["column_name"] = "birth"
+        self.default_row["data_type"] = "date"
+        self.default_row["column_type"] = "date"
+
+        field = self.creator.create(
+            self.default_row, {"start": datetime(1990, 8, 28)})
+        self.assertEquals(mysql.DateField, field.__class__)
+        self.assertEquals(date(1990, 8, 28), field.start)
+        self.assertEquals(None, field.end)
+
 
 class BaseTestField(unittest.TestCase):
     __metaclass__ = ABCMeta
 
     def setUp(self):
         self.field = self._create_field()
+        self.field.content_gen = self._create_content_gen()
 
+    def _create_content_gen(self):
         seed = "28391kaasd9129akdbb1o293"
         rnd = Random()
         rnd.seed(seed)
-        self.field.content_gen = ContentGen(rnd)
+        return ContentGen(rnd)
 
     def _create_field(self):
         return self.get_test_class()("generic_field")
 
+    def assertCompiledEqualsRandomValues(self, count=10):
+        values = [self.field.get_random_value() for i in xrange(count)]
+
+        generate = self._create_field().compile(self._create_content_gen())
+        self.assertEquals(values, [generate() for i in xrange(count)])
+
     @abstractmethod
     def get_test_class(self):
         return NotImplemented
@@ -226,6 +496,32 @@ class TestIntegerField(BaseTestField):
     def test_get_content_gen(self):
         self.assertEquals(1188699766, self.field.get_random_value())
 
+    def test_compile(self):
+        self.assertCompiledEqualsRandomValues()
+
+    def test_nullable(self):
+        field = self.get_test_class()("generic_field", nullable=True)
+        generate = field.compile(self._create_content_gen())
+
+        values = [generate() for i in xrange(100)]
+        self.assertIn(None, values)
+        self.assertTrue(values.count(None) < 50)
+
+    def test_get_random_values(self):
+        values = self.field.get_random_values(100)
+
+        self.assertEquals(100, len(values))
+        for i in values:
+            self.assertTrue(-2147483647 <= i <= 2147483647)
+
+    def test_get_random_values_nullable(self):
+        field = self.get_test_class()("generic_field", nullable=True)
+        field.content_gen = self._create_content_gen()
+
+        values = field.get_random_values(100)
+        self.assertIn(None, values)
+        self.assertTrue(values.count(None) < 50)
+
 
 class TestTinyintField(BaseTestField):
     def get_test_class(self):
@@ -280,21 +576,48 @@ class TestDecimalField(BaseTestField):
         self.assertRaises(ValueError, self.get_test_class(), "value", 3, 4)
 
     def test_get_content_gen(self):
-        self.assertEquals(553.18, self.field.get_random_value())
-        self.assertEquals(138.8, self.field.get_random_value())
+        self.assertEquals(Decimal("553.53"), self.field.get_random_value())
+        self.assertEquals(Decimal("-624.54"), self.field.get_random_value())
+
+    def test_compile(self):
+        self.assertCompiledEqualsRandomValues()
+
+    def test_get_random_values(self):
+        values = self.field.get_random_values(100)
+        self.assertEquals(100, len(values))
+        for value in values:
+            self.assertTrue(-1000 < value < 1000)
+            cents = float(value) * 100
+            self.assertAlmostEquals(round(cents), cents)
+
+    def test_scale_is_kept(self):
+        field = self.get_test_class()("value", 3, 3, unsigned=True)
+        field.content_gen = self._create_content_gen()
+        for value in field.get_random_values(100):
+            self.assertTrue(0 <= value < 1)
+
+    def test_creation_without_scale(self):
+        field = self.get_test_class()("value", 4, None)
+        field.content_gen = self._create_content_gen()
+        value = field.get_random_value()
+        self.assertEquals(int(value), value)
 
 
 class TestFloatField(TestDecimalField):
     def get_test_class(self):
         return mysql.FloatField
 
+    def test_get_content_gen(self):
+        self.assertEquals(553.53, self.field.get_random_value())
+        self.assertEquals(-624.54, self.field.get_random_value())
 
-class TestRealField(TestDecimalField):
+
+class TestRealField(TestFloatField):
     def get_test_class(self):
         return mysql.RealField
 
 
-class TestDoubleField(TestDecimalField):
+class TestDoubleField(TestFloatField):
     def get_test_class(self):
         return mysql.DoubleField
 
@@ -311,21 +634,47 @@ class TestDateField(BaseTestField):
     def test_get_content_gen(self):
         self.assertEquals(date(2016, 11, 16), self.field.get_random_value())
 
+    def test_compile(self):
+        self.assertCompiledEqualsRandomValues()
+
+    def test_bounds(self):
+        start, end = date(1990, 8, 28), date(1990, 9, 1)
+        field = self.get_test_class()("generic_field", start, end)
+        field.content_gen = self._create_content_gen()
+
+        values = field.get_random_values(100)
+        self.assertEquals(5, len(set(values)))
+        for value in values:
+            self.assertTrue(start <= value <= end)
+
 
 class TestDatetimeField(BaseTestField):
     def get_test_class(self):
         return mysql.DatetimeField
 
     def test_get_content_gen(self):
-        dt = datetime(2016, 11, 16, 0, 18, 55, 319481)
-        result = self.field.get_random_value()
+        self.assertEquals("2016-11-15 14:28:36", self.field.get_random_value())
+
+    def test_compile(self):
+        self.assertCompiledEqualsRandomValues()
+
+    def test_bounds(self):
+        start = datetime(1990, 8, 28, 23, 59, 0)
+        end = datetime(1990, 8, 29, 0, 1, 0)
+        field = self.get_test_class()("generic_field", start, end)
+        field.content_gen = self._create_content_gen()
 
-        self.assertEquals(dt.year, result.year)
-        self.assertEquals(dt.month, result.month)
-        self.assertEquals(dt.day, result.day)
-        self.assertIn(result.hour, range(0, 24))
-        self.assertIn(result.minute, range(0, 59))
-        self.assertIn(result.second, range(0, 59))
+        for value in field.get_random_values(100) + [
+                field.get_random_value()]:
+            parsed = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+            self.assertTrue(start <= parsed <= end)
+
+    def test_date_bounds(self):
+        field = self.get_test_class()(
+            "generic_field", date(1990, 8, 28), date(1990, 8, 29))
+
+        self.assertEquals(datetime(1990, 8, 28), field.start)
+        self.assertEquals(datetime(1990, 8, 29), field.end)
 
 
 class TestTimestampField(BaseTestField):
@@ -341,7 +690,17 @@ class TestTimeField(BaseTestField):
         return mysql.TimeField
 
     def test_get_content_gen(self):
-        self.assertEquals("18:11:34", self.field.get_random_value())
+        self.assertEquals("18:38:11", self.field.get_random_value())
+
+    def test_compile(self):
+        self.assertCompiledEqualsRandomValues()
+
+    def test_get_random_values(self):
+        for value in self.field.get_random_values(100):
+            hours, minutes, seconds = [int(i) for i in value.split(":")]
+            self.assertIn(hours, range(0, 24))
+            self.assertIn(minutes, range(0, 60))
+            self.assertIn(seconds, range(0, 60))
 
 
 class TestYearField(BaseTestField):
@@ -364,6 +723,9 @@ class TestCharField(BaseTestField):
         self.assertEquals("Ut ", self.field.get_random_value())
         self.assertEquals("In ullamcor", self.field.get_random_value())
 
+    def test_compile(self):
+        self.assertCompiledEqualsRandomValues()
+
 
 class TestVarcharFeld(TestCharField):
     def get_test_class(self):
@@ -416,6 +778,9 @@ class TestEnumField(BaseTestField):
     def test_get_content_gen(self):
         self.assertEquals("test',strage2", self.field.get_random_value())
 
+    def test_compile(self):
+        self.assertCompiledEqualsRandomValues()
+
 
 class TestSetField(BaseTestField):
     database_spec =\
@@ -440,3 +805,48 @@ class TestSetField(BaseTestField):
         self.assertEquals("a,b',c", self.field.get_random_value())
         self.assertEquals("a,dd", self.field.get_random_value())
         self.assertEquals("e", self.field.get_random_value())
+
+    def test_compile(self):
+        self.assertCompiledEqualsRandomValues()
+
+    def test_get_random_values(self):
+        values = self.field.get_random_values(100)
+        self.assertEquals(100, len(values))
+        for value in values:
+            options = value.split(",")
+            self.assertEquals(sorted(set(options)), options)
+            for option in options:
+                self.assertIn(option, self.field.options)
+
+
+class TestEscapeLoadData(unittest.TestCase):
+    def test_null(self):
+        self.assertEquals("\\N", mysql.escape_load_data(None))
+
+    def test_dates(self):
+        self.assertEquals(
+            "2014-03-05", mysql.escape_load_data(date(2014, 3, 5))
+        )
+
+        self.assertEquals(
+            "2014-03-05 10:20:30",
+            mysql.escape_load_data(datetime(2014, 3, 5, 10, 20, 30))
+        )
+
+    def test_numbers(self):
+        self.assertEquals("-12", mysql.escape_load_data(-12))
+        self.assertEquals("553.18", mysql.escape_load_data(553.18))
+
+    def test_set_options(self):
+        self.assertEquals("a,b',c", mysql.escape_load_data("a,b',c"))
+
+    def test_special_chars(self):
+        self.assertEquals(
+            "a\\tb\\\\c\\nd\\re\\0",
+            mysql.escape_load_data("a\tb\\c\nd\re\x00")
+        )
+
+    def test_unicode(self):
+        self.assertEquals(
+            "ma\xc3\xa7\xc3\xa3", mysql.escape_load_data(u"ma\xe7\xe3")
+        )
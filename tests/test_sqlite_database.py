@@ -1,7 +1,12 @@
 import unittest
 from loremdb.database.sqlite import Table, TypeAffinity, DataBase
-from loremdb.util import ContentGen
+from loremdb.database.core import ForeignKey, KeyPool
+from loremdb.database.cache import SchemaCache
+from loremdb.database.checkpoint import Checkpoint
+from loremdb.util import ContentGen, CounterContentGen
+import os
 import sqlite3
+import threading
 
 
 class TypeAffinityTestCase(unittest.TestCase):
@@ -127,6 +132,206 @@ class TestDataBase(SqliteDataBaseTestCase):
         results = c.execute("SELECT * from permissions")
         self.assertEquals(10, len(results.fetchall()))
 
+    def test_fast_fill(self):
+        self._database.fast = True
+        self._database.fill(n=10)
+
+        c = self._database.get_cursor()
+        results = c.execute("SELECT * from users")
+        self.assertEquals(10, len(results.fetchall()))
+
+        results = c.execute("SELECT * from permissions")
+        self.assertEquals(10, len(results.fetchall()))
+
+    def test_fast_fill_restores_pragmas(self):
+        c = self._database.get_cursor()
+        pragmas = [
+            c.execute("PRAGMA {0}".format(name)).fetchone()
+            for name, _ in self._database.fast_pragmas
+        ]
+
+        self._database.fast = True
+        self._database.fill(n=10)
+
+        self.assertEquals(pragmas, [
+            c.execute("PRAGMA {0}".format(name)).fetchone()
+            for name, _ in self._database.fast_pragmas
+        ])
+
+    def test_fast_fill_is_a_single_transaction(self):
+        self.tables = []
+        self._database.on_change_table.register(self.change_table_callback)
+        self._database.on_rows_inserted.register(self.crash_callback)
+
+        self._database.fast = True
+        self.assertRaises(ValueError, self._database.fill, n=10)
+
+        # Rows of the first table weren't committed by the second one
+        c = self.conn.cursor()
+        for name in ["permissions", "users"]:
+            c.execute("SELECT COUNT(*) FROM {0}".format(name))
+            self.assertEquals((0,), c.fetchone())
+
+    def crash_callback(self, table_info, count, errors):
+        if len(self.tables) == 2:
+            raise ValueError("Crash")
+
+    def create_indexes(self):
+        c = self.conn.cursor()
+        c.execute("CREATE INDEX users_age ON users (age)")
+        c.execute("CREATE INDEX users_name ON users (name, last_name)")
+        c.execute("CREATE UNIQUE INDEX users_document ON users (document)")
+        self.conn.commit()
+
+    def get_indexes(self):
+        c = self.conn.cursor()
+        c.execute("SELECT name FROM sqlite_master WHERE type='index' "
+                  "ORDER BY name")
+        return [name for (name,) in c.fetchall()]
+
+    def test_fill_with_rebuild_indexes(self):
+        self.create_indexes()
+        indexes = self.get_indexes()
+
+        self.indexes_while_filling = []
+        self._database.on_change_table.register(self.indexes_callback)
+        self._database.rebuild_indexes = True
+        self._database.fill(n=10)
+
+        self.assertEquals(["users_document"], self.indexes_while_filling[0])
+        self.assertEquals(indexes, self.get_indexes())
+
+        c = self.conn.cursor()
+        c.execute("SELECT DISTINCT tbl FROM sqlite_stat1 ORDER BY tbl")
+        self.assertEquals([("permissions",), ("users",)], c.fetchall())
+
+        # ANALYZE's tables aren't filled
+        self.assertEquals(
+            ["permissions", "users"], sorted(self._database.get_tables()))
+
+    def test_failed_fill_with_rebuild_indexes(self):
+        self.create_indexes()
+        indexes = self.get_indexes()
+
+        self._database.on_change_table.register(self.failure_callback)
+        self._database.rebuild_indexes = True
+        self._database.fast = True
+        self.assertRaises(ValueError, self._database.fill, n=10)
+
+        self.assertEquals(indexes, self.get_indexes())
+
+    def indexes_callback(self, table_info):
+        self.indexes_while_filling.append(self.get_indexes())
+
+    def failure_callback(self, table_info):
+        raise ValueError("Broken fill")
+
+    def test_fill_with_commit_per_table(self):
+        self.commits = []
+        self._database.on_commit.register(self.commit_callback)
+
+        self._database.fill(n=10, commit_per_table=True)
+
+        self.assertEquals(2, len(self.commits))
+        self.assertEquals([10, 10], [rows for _, rows in self.commits])
+
+    def commit_callback(self, table_info, rows):
+        self.commits.append((table_info, rows))
+
+    def test_fill_with_jobs(self):
+        self.inserts = 0
+        self.tables = []
+        self._database.on_insert.register(self.insert_callback)
+        self._database.on_change_table.register(self.change_table_callback)
+
+        # Tables are committed as soon as filled,
+        # SQLite allows only one writer at a time
+        self._database.fill(n=10, jobs=2, commit_per_table=True)
+
+        c = self._database.get_cursor()
+        results = c.execute("SELECT * from users")
+        self.assertEquals(10, len(results.fetchall()))
+
+        results = c.execute("SELECT * from permissions")
+        self.assertEquals(10, len(results.fetchall()))
+
+        self.assertEquals(20, self.inserts)
+        self.assertEquals(
+            ["permissions", "users"],
+            sorted([i["name"] for i in self.tables])
+        )
+
+    def insert_callback(self):
+        self.inserts += 1
+
+    def test_fill_signals_rows_inserted(self):
+        self.reports = []
+        self._database.on_rows_inserted.register(self.rows_inserted_callback)
+
+        self._database.fill(n=25, batch_size=10)
+
+        for name in ["permissions", "users"]:
+            counts = [
+                count for table_info, count, _ in self.reports
+                if table_info["name"] == name
+            ]
+            self.assertEquals(25, sum(counts))
+
+    def rows_inserted_callback(self, table_info, count, errors):
+        self.reports.append((table_info, count, errors))
+
+    def change_table_callback(self, table_info):
+        self.tables.append(table_info)
+
+    def test_fill_with_row_targets(self):
+        self._database.row_targets = {"users": 5}
+        self._database.fill(n=10)
+
+        self.assertEquals(5, self._database.count_rows("users"))
+        self.assertEquals(10, self._database.count_rows("permissions"))
+
+    def test_fill_with_top_up(self):
+        self._database.fill(n=4)
+
+        self._database.top_up = True
+        self._database.row_targets = {"permissions": 4}
+        self.tables = []
+        self._database.on_change_table.register(self.change_table_callback)
+        self._database.fill(n=10)
+
+        # Full tables aren't filled again
+        self.assertEquals([{"name": "users", "start": 4}], self.tables)
+
+        c = self._database.get_cursor()
+        results = c.execute("SELECT user_id FROM users ORDER BY user_id")
+        self.assertEquals(range(1, 11), [i for (i,) in results])
+        self.assertEquals(4, self._database.count_rows("permissions"))
+
+    def test_fill_with_row_targets_of_unexpected_tables(self):
+        self._database.row_targets = {"user": 5}
+        self.assertRaises(Exception, self._database.fill, n=10)
+
+    def test_fill_with_row_targets_out_of_the_filter(self):
+        self._database.row_targets = {"users": 5, "permissions": 7}
+        self._database.filter("users")
+        self._database.fill(n=10)
+
+        self.assertEquals(5, self._database.count_rows("users"))
+        self.assertEquals(0, self._database.count_rows("permissions"))
+
+    def test_get_unknown_tables(self):
+        self._database.filter("users")
+        self.assertEquals(
+            ["user"],
+            self._database.get_unknown_tables(["permissions", "user"]))
+
+    def test_count_rows(self):
+        self.assertEquals(0, self._database.count_rows("users"))
+
+        self._database.fill(n=3)
+
+        self.assertEquals(3, self._database.count_rows("users"))
+
     def test_get_tables(self):
         tables = self._database.get_tables()
 
@@ -136,6 +341,492 @@ class TestDataBase(SqliteDataBaseTestCase):
         self.assertTrue("permissions" in tables)
 
 
+class TestSchemaCache(SqliteDataBaseTestCase):
+    cache_path = "/tmp/loremdb-unittest-schema-cache"
+
+    def setUp(self):
+        super(TestSchemaCache, self).setUp()
+
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+        self._database.schema_cache = SchemaCache(self.cache_path)
+        self.introspections = []
+
+    def tearDown(self):
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+    def introspect(self, name):
+        self.introspections.append(name)
+        return Table(self._database, name, ContentGen())._introspect_fields()
+
+    def load_fields(self, name):
+        return self._database.load_fields(name, lambda: self.introspect(name))
+
+    def test_fields_loaded_from_saved_cache(self):
+        fields = self.load_fields("users")
+        self._database.schema_cache.save()
+
+        self._database.schema_cache = SchemaCache(self.cache_path)
+        cached_fields = self.load_fields("users")
+
+        self.assertEquals(["users"], self.introspections)
+        self.assertEquals(
+            [(i.__class__, i.__dict__) for i in fields],
+            [(i.__class__, i.__dict__) for i in cached_fields]
+        )
+
+    def test_changed_table_is_introspected(self):
+        self.load_fields("permissions")
+
+        c = self.conn.cursor()
+        c.execute("alter table permissions add column note text")
+        self.conn.commit()
+
+        fields = self.load_fields("permissions")
+
+        self.assertEquals(["permissions", "permissions"], self.introspections)
+        self.assertEquals("note", fields[-1].name)
+
+    def test_fill_saves_cache(self):
+        self._database.fill(n=10)
+
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        self._database.schema_cache = SchemaCache(self.cache_path)
+        self.load_fields("users")
+        self.assertEquals([], self.introspections)
+
+    def test_changed_column_options_are_introspected(self):
+        self.load_fields("users")
+        self._database.column_options = {"users": {"age": {"end": 10}}}
+        self.load_fields("users")
+        self.load_fields("users")
+
+        self.assertEquals(["users", "users"], self.introspections)
+
+    def test_contains(self):
+        cache = self._database.schema_cache
+        cache.set("users", 1, [])
+
+        self.assertTrue(cache.contains("users", 1))
+        self.assertFalse(cache.contains("users", 2))
+        self.assertFalse(cache.contains("permissions", 1))
+
+    def test_broken_file_is_empty_cache(self):
+        with open(self.cache_path, "w") as f:
+            f.write("broken")
+
+        self.assertEquals(None, SchemaCache(self.cache_path).get("users", 1))
+
+
+class TestCheckpoint(SqliteDataBaseTestCase):
+    checkpoint_path = "/tmp/loremdb-unittest-checkpoint"
+
+    def setUp(self):
+        super(TestCheckpoint, self).setUp()
+        self.remove_checkpoint()
+        self._database.checkpoint = Checkpoint(self.checkpoint_path, 1)
+
+    def tearDown(self):
+        self.remove_checkpoint()
+
+    def remove_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def count_rows(self, name):
+        c = self.conn.cursor()
+        c.execute("SELECT COUNT(*) FROM {0}".format(name))
+        return c.fetchone()[0]
+
+    def test_fill_saves_checkpoint(self):
+        self._database.fill(n=10, batch_size=4, commit_every=4)
+
+        checkpoint = Checkpoint(self.checkpoint_path)
+        checkpoint.load()
+        self.assertEquals(1, checkpoint.seed)
+        self.assertEquals(10, checkpoint.get_rows("users"))
+        self.assertEquals(10, checkpoint.get_rows("permissions"))
+
+    def test_resume(self):
+        self._database.checkpoint.set_rows("permissions", 10)
+        self._database.checkpoint.set_rows("users", 6)
+
+        self._database.fill(n=10)
+
+        self.assertEquals(0, self.count_rows("permissions"))
+        self.assertEquals(4, self.count_rows("users"))
+        self.assertEquals(10, self._database.checkpoint.get_rows("users"))
+
+    def test_stop_and_resume(self):
+        self._database.on_commit.register(self.commit_callback)
+        self._database.fill(n=25, batch_size=5, commit_every=5)
+
+        # Rows processed when stopped are committed
+        self.assertTrue(self._database.interrupted)
+        checkpoint = Checkpoint(self.checkpoint_path)
+        checkpoint.load()
+        rows = [checkpoint.get_rows(i) for i in ["permissions", "users"]]
+        self.assertEquals(10, sum(rows))
+        self.assertEquals(
+            rows, [self.count_rows(i) for i in ["permissions", "users"]])
+
+        self._database.on_commit.unregister(self.commit_callback)
+        self._database.checkpoint = checkpoint
+        self._database.fill(n=25, batch_size=5, commit_every=5)
+
+        self.assertFalse(self._database.interrupted)
+        self.assertEquals(25, self.count_rows("permissions"))
+        self.assertEquals(25, self.count_rows("users"))
+
+    def commit_callback(self, table_info, rows):
+        if rows == 10:
+            self._database.stop()
+
+    def test_resumed_fill_equals_uninterrupted_fill(self):
+        self._database = DataBase(ContentGen(seed=1), self.database_name)
+        self._database.fill(n=10, batch_size=2)
+        expected = self.get_rows()
+
+        self.create_tables()
+        self._database = DataBase(ContentGen(seed=1), self.database_name)
+        self._database.checkpoint = Checkpoint(self.checkpoint_path, 1)
+        self._database.on_commit.register(self.stop_callback)
+        self._database.fill(n=10, batch_size=2, commit_every=6)
+        self.assertTrue(self._database.interrupted)
+
+        self._database.on_commit.unregister(self.stop_callback)
+        self._database.fill(n=10, batch_size=2)
+
+        self.assertEquals(expected, self.get_rows())
+
+    def stop_callback(self, table_info, rows):
+        if table_info["name"] == "users":
+            self._database.stop()
+
+    def get_rows(self):
+        c = self.conn.cursor()
+        return [
+            c.execute("SELECT * FROM {0} ORDER BY 1".format(i)).fetchall()
+            for i in ["permissions", "users"]
+        ]
+
+    def test_crash_leaves_checkpoint_of_committed_rows(self):
+        self.tables = []
+        self._database.on_change_table.register(self.change_table_callback)
+        self._database.on_insert.register(self.crash_callback)
+
+        self.assertRaises(ValueError, self._database.fill, n=10)
+        self._database.get_conn().rollback()
+
+        # Rows committed (seen by another connection) are the ones saved
+        checkpoint = Checkpoint(self.checkpoint_path)
+        if os.path.exists(self.checkpoint_path):
+            checkpoint.load()
+
+        for table_info in self.tables:
+            name = table_info["name"]
+            self.assertEquals(
+                checkpoint.get_rows(name), self.count_rows(name))
+
+    def change_table_callback(self, table_info):
+        self.tables.append(table_info)
+
+    def crash_callback(self):
+        if len(self.tables) == 2:
+            raise ValueError("Crash")
+
+    def test_sharded_fill_is_rejected(self):
+        self.assertRaises(
+            ValueError, self._database.fill, n=2000, shards=2)
+
+    def test_load_invalid_checkpoint(self):
+        with open(self.checkpoint_path, "w") as f:
+            f.write("[1, 2")
+
+        self.assertRaises(ValueError, Checkpoint(self.checkpoint_path).load)
+
+
+class TestForeignKeys(SqliteDataBaseTestCase):
+    def setUp(self):
+        super(TestForeignKeys, self).setUp()
+
+        c = self.conn.cursor()
+        self.drop_tables()
+        c.execute("create table authors (id integer primary key, name text)")
+        c.execute("""create table books (
+            id integer primary key,
+            author_id integer references authors,
+            title text
+        )""")
+        c.execute("""create table editions (
+            book_id integer,
+            author_id integer,
+            foreign key (book_id, author_id) references books (id, author_id)
+        )""")
+        self.conn.commit()
+
+        self._database.filter("editions", "books", "authors")
+
+    def tearDown(self):
+        self.drop_tables()
+
+    def drop_tables(self):
+        c = self.conn.cursor()
+        for name in ["editions", "books", "authors"]:
+            c.execute("drop table if exists {0}".format(name))
+
+        self.conn.commit()
+
+    def test_get_foreign_keys(self):
+        foreign_keys = self._database.get_foreign_keys()
+
+        self.assertEquals(
+            [ForeignKey(("author_id",), "authors", ("id",))],
+            foreign_keys["books"]
+        )
+        self.assertEquals(
+            [ForeignKey(("book_id", "author_id"), "books",
+                        ("id", "author_id"))],
+            foreign_keys["editions"]
+        )
+
+    def test_fill_parents_first(self):
+        self.tables = []
+        self._database.on_change_table.register(self.change_table_callback)
+
+        self._database.fill(n=10)
+
+        self.assertEquals(["authors", "books", "editions"], self.tables)
+
+    def change_table_callback(self, table_info):
+        self.tables.append(table_info["name"])
+
+    def test_fill_with_parent_keys(self):
+        self._database.fill(n=50)
+        self.assert_parent_keys()
+
+    def test_fill_with_jobs_waits_for_parents(self):
+        self._database.fill(n=50, jobs=3, commit_per_table=True)
+        self.assert_parent_keys()
+
+    def test_fill_with_shards_after_parents(self):
+        # Authors are filled by this connection, books by the shards
+        self._database.filter("books", "authors")
+        self._database.row_targets = {"authors": 10}
+        self._database.fill(n=2500, shards=2, batch_size=100)
+
+        c = self._database.get_cursor()
+        c.execute("""SELECT COUNT(*) FROM books
+            WHERE author_id IN (SELECT id FROM authors)""")
+        self.assertEquals((2500,), c.fetchone())
+
+    def test_vectorized_fill_with_parent_keys(self):
+        self._database._content_gen = VectorizedContentGen()
+        self._database.fill(n=50, batch_size=10)
+        self.assert_parent_keys()
+
+    def assert_parent_keys(self):
+        c = self._database.get_cursor()
+
+        (orphans,) = c.execute("""SELECT count(*) FROM books
+            WHERE author_id NOT IN (SELECT id FROM authors)""").fetchone()
+        self.assertEquals(0, orphans)
+
+        (orphans,) = c.execute("""SELECT count(*) FROM editions e
+            WHERE NOT EXISTS (SELECT 1 FROM books b
+                WHERE b.id = e.book_id AND b.author_id = e.author_id)
+        """).fetchone()
+        self.assertEquals(0, orphans)
+
+        (editions,) = c.execute("SELECT count(*) FROM editions").fetchone()
+        self.assertEquals(50, editions)
+
+
+class TestUniqueKeys(SqliteDataBaseTestCase):
+    def setUp(self):
+        super(TestUniqueKeys, self).setUp()
+
+        c = self.conn.cursor()
+        self.drop_tables()
+        c.execute("""create table tags (
+            id integer primary key,
+            name varchar(6) unique
+        )""")
+        c.execute("create table posts (id integer primary key, title text)")
+        c.execute("""create table post_tags (
+            post_id integer references posts,
+            tag_id integer references tags,
+            primary key (post_id, tag_id)
+        )""")
+        self.conn.commit()
+
+        self.errors = 0
+        self._database.on_insert_error.register(self.error_callback)
+
+    def tearDown(self):
+        self.drop_tables()
+
+    def drop_tables(self):
+        c = self.conn.cursor()
+        for name in ["post_tags", "posts", "tags"]:
+            c.execute("drop table if exists {0}".format(name))
+
+        self.conn.commit()
+
+    def error_callback(self, e):
+        self.errors += 1
+
+    def test_get_unique_keys(self):
+        unique_keys = self._database.get_unique_keys()
+
+        self.assertEquals([("id",), ("name",)], unique_keys["tags"])
+        self.assertEquals([("post_id", "tag_id")], unique_keys["post_tags"])
+
+    def test_fill_without_collisions(self):
+        self._database.filter("tags")
+        self._database.fill(n=2000, batch_size=100)
+
+        # Values continue after the ones in the table
+        self._database.fill(n=500)
+
+        c = self._database.get_cursor()
+        (rows, names) = c.execute(
+            "SELECT count(*), count(distinct name) FROM tags").fetchone()
+
+        self.assertEquals(0, self.errors)
+        self.assertEquals(2500, rows)
+        self.assertEquals(2500, names)
+
+    def test_fill_composite_key_of_foreign_keys(self):
+        self._database.filter("post_tags", "posts", "tags")
+        self._database._content_gen = VectorizedContentGen()
+        self._database.fill(n=20, batch_size=10)
+
+        self.assertEquals(0, self.errors)
+
+        # There are 400 combinations of post and tag
+        self._database.filter("post_tags")
+        self._database.fill(n=380)
+
+        c = self._database.get_cursor()
+        (rows,) = c.execute("SELECT count(*) FROM post_tags").fetchone()
+
+        self.assertEquals(0, self.errors)
+        self.assertEquals(400, rows)
+
+
+class TestErrorBreaker(SqliteDataBaseTestCase):
+    def setUp(self):
+        super(TestErrorBreaker, self).setUp()
+
+        # All inserts fail
+        c = self.conn.cursor()
+        c.execute("drop table if exists rejected")
+        c.execute("create table rejected (value integer check (value < 0))")
+        self.conn.commit()
+
+        self.table = Table(self._database, "rejected", ContentGen())
+        self.abandoned = []
+
+    def tearDown(self):
+        self._database.get_conn().commit()
+
+        c = self.conn.cursor()
+        c.execute("drop table if exists rejected")
+        self.conn.commit()
+
+    def test_fill_abandoned(self):
+        self.table.fill(n=5000, max_error_ratio=0.9, error_window=100)
+
+        self.assertTrue(self.table.abandoned)
+        self.assertEquals(100, self.table.rows_done)
+
+    def test_fill_abandoned_with_batch_size(self):
+        self.table.fill(
+            n=5000, batch_size=30, max_error_ratio=0.9, error_window=100)
+
+        self.assertTrue(self.table.abandoned)
+        self.assertEquals(120, self.table.rows_done)
+
+    def test_fill_without_breaker(self):
+        self.table.fill(n=200)
+
+        self.assertFalse(self.table.abandoned)
+        self.assertEquals(200, self.table.errors_done)
+
+    def test_classify_error(self):
+        self.errors = []
+        self.table.on_insert_error.register(self.error_callback)
+        self.table.fill(n=1)
+
+        self.assertEquals(
+            "check", self._database.classify_error(self.errors[0]))
+        self.assertEquals(
+            "duplicate-key",
+            self._database.classify_error(
+                sqlite3.IntegrityError("UNIQUE constraint failed: t.id"))
+        )
+        self.assertEquals(
+            "other", self._database.classify_error(Exception("Unexpected")))
+
+    def error_callback(self, e):
+        self.errors.append(e)
+
+    def test_database_fill_with_deferred_table(self):
+        self._database.on_table_abandoned.register(self.abandoned_callback)
+        self._database.filter("rejected", "permissions")
+
+        self._database.fill(
+            n=500, max_error_ratio=0.5, error_window=100,
+            breaker_action="defer")
+
+        self.assertEquals(
+            [("rejected", 100, True), ("rejected", 100, False)],
+            self.abandoned
+        )
+
+    def abandoned_callback(self, table_info, rows, deferred):
+        self.abandoned.append((table_info["name"], rows, deferred))
+
+    def test_database_fill_signals_finished_tables(self):
+        self.finished = []
+        self._database.on_table_finished.register(self.finished_callback)
+        self._database.filter("rejected", "permissions")
+
+        self._database.fill(
+            n=500, max_error_ratio=0.5, error_window=100,
+            breaker_action="defer")
+
+        # Abandoned tables are finished too, with the rows processed
+        self.assertEquals(
+            [("rejected", 100), ("permissions", 500), ("rejected", 200)],
+            self.finished
+        )
+
+    def finished_callback(self, table_info, rows):
+        self.finished.append((table_info["name"], rows))
+
+
+class TestKeyPool(unittest.TestCase):
+    def test_sample(self):
+        pool = KeyPool(2)
+        pool.add((1, "a"))
+        pool.add((None, "b"))
+        pool.add((3, "c"))
+
+        self.assertEquals(2, len(pool))
+        self.assertEquals((3, "c"), pool.get(1))
+        self.assertTrue(pool.sample(ContentGen()) in [(1, "a"), (3, "c")])
+
+        columns = pool.samples(ContentGen(), 5)
+        self.assertEquals(2, len(columns))
+        for key in zip(*columns):
+            self.assertTrue(key in [(1, "a"), (3, "c")])
+
+
 class TestTable(SqliteDataBaseTestCase):
     def setUp(self):
         super(TestTable, self).setUp()
@@ -152,3 +843,348 @@ class TestTable(SqliteDataBaseTestCase):
 
         results = c.execute("SELECT name, age from users")
         self.assertEquals(10, len(results.fetchall()))
+
+    def test_fill_with_commit_every(self):
+        self.commits = []
+        self.errors = 0
+        self.table.on_commit.register(self.commit_callback)
+        self.table.on_insert_error.register(self.error_callback)
+
+        self.table.fill(n=25, commit_every=10)
+        self._database.get_conn().rollback()
+
+        self.assertEquals([10, 20], self.commits)
+        self.assertEquals(0, self.errors)
+
+        # Committed rows are visible from other connections
+        results = self.conn.execute("SELECT name from users")
+        self.assertEquals(20, len(results.fetchall()))
+
+    def test_fill_with_commit_every_and_batch_size(self):
+        self.commits = []
+        self.table.on_commit.register(self.commit_callback)
+
+        self.table.fill(n=25, batch_size=4, commit_every=10)
+
+        self.assertEquals([12, 24], self.commits)
+
+        self._database.get_conn().commit()
+
+    def commit_callback(self, table_info, rows):
+        self.commits.append(rows)
+
+    def test_fill_with_batch_size(self):
+        c = self._database.get_cursor()
+
+        self.errors = 0
+        self.table.on_insert_error.register(self.error_callback)
+
+        self.table.fill(n=25, batch_size=10)
+        self._database.get_conn().commit()
+
+        results = c.execute("SELECT name, age from users")
+        self.assertEquals(25, len(results.fetchall()))
+        self.assertEquals(0, self.errors)
+
+    def error_callback(self, e):
+        self.errors += 1
+
+
+class VectorizedContentGen(ContentGen):
+    """
+    Makes tables generate values by column (without NumPy)
+    """
+    vectorized = True
+
+
+class TestTableVectorized(SqliteDataBaseTestCase):
+    def setUp(self):
+        super(TestTableVectorized, self).setUp()
+        self.table = Table(self._database, "users", VectorizedContentGen())
+
+    def test_fill(self):
+        c = self._database.get_cursor()
+
+        self.errors = 0
+        self.table.on_insert_error.register(self.error_callback)
+
+        self.table.fill(n=25)
+        self._database.get_conn().commit()
+
+        results = c.execute("SELECT name, age from users")
+        self.assertEquals(25, len(results.fetchall()) + self.errors)
+
+    def error_callback(self, e):
+        self.errors += 1
+
+    def test_generate_rows(self):
+        rows = list(self.table._generate_rows(0, 15))
+
+        self.assertEquals(15, len(rows))
+        for row in rows:
+            self.assertEquals(8, len(row))
+
+
+class SmallBlocksTable(Table):
+    block_size = 100
+
+
+class TestTableSharded(SqliteDataBaseTestCase):
+    def setUp(self):
+        super(TestTableSharded, self).setUp()
+
+        # Without unique keys, rows don't depend on the insertion order
+        c = self.conn.cursor()
+        c.execute("drop table if exists events")
+        c.execute("create table events (value integer, name text)")
+        self.conn.commit()
+
+        self.table = SmallBlocksTable(
+            self._database, "events", ContentGen(seed=42)
+        )
+        self.inserts = 0
+        self.errors = 0
+        self.table.on_insert.register(self.insert_callback)
+        self.table.on_insert_error.register(self.error_callback)
+
+    def tearDown(self):
+        c = self.conn.cursor()
+        c.execute("drop table if exists events")
+        self.conn.commit()
+
+    def insert_callback(self):
+        self.inserts += 1
+
+    def error_callback(self, e):
+        self.errors += 1
+
+    def test_fill_with_shards_abandoned(self):
+        c = self.conn.cursor()
+        c.execute("drop table if exists events")
+        c.execute("create table events (value integer check (value < 0))")
+        self.conn.commit()
+
+        self.table.fill(
+            n=5000, shards=2, max_error_ratio=0.9, error_window=100)
+        self._database.get_conn().commit()
+
+        self.assertTrue(self.table.abandoned)
+        self.assertTrue(self.table.rows_done < 5000)
+        self.assertEquals(self.table.rows_done, self.errors)
+
+    def test_fill_with_shards_equals_serial_fill_counter_based(self):
+        self.table = SmallBlocksTable(
+            self._database, "events", CounterContentGen(seed=42)
+        )
+
+        self.table.fill(n=550)
+        self._database.get_conn().commit()
+        serial_rows = self.get_rows()
+
+        self.table.fill(n=550, shards=3)
+        self.assertEquals(serial_rows, self.get_rows())
+
+    def test_get_row_counter_based(self):
+        self.table = SmallBlocksTable(
+            self._database, "events", CounterContentGen(seed=42)
+        )
+
+        rows = list(self.table._generate_rows(0, 550))
+        self.assertEquals(rows[0], self.table.get_row(0))
+        self.assertEquals(rows[321], self.table.get_row(321))
+        self.assertEquals(rows[250:260], list(
+            self.table._generate_rows(250, 260)))
+
+    def get_rows(self):
+        c = self._database.get_cursor()
+        rows = c.execute("SELECT * from events").fetchall()
+        c.execute("DELETE from events")
+        self._database.get_conn().commit()
+        return sorted(rows)
+
+    def test_fill_with_shards_equals_serial_fill(self):
+        self.table.fill(n=550)
+        self._database.get_conn().commit()
+        serial_rows = self.get_rows()
+
+        self.table.fill(n=550, shards=3)
+        self.assertEquals(serial_rows, self.get_rows())
+        self.assertEquals(1100, self.inserts)
+        self.assertEquals(0, self.errors)
+
+    def test_fill_range_in_the_middle_of_a_block(self):
+        rows = list(self.table._generate_rows(0, 250))
+        self.assertEquals(
+            rows[130:], list(self.table._generate_rows(130, 250))
+        )
+
+    def test_partial_block_generates_rows_needed(self):
+        self.generated = 0
+        generate_block = self.table._generate_block
+
+        def count_rows(content_gen, n, start=0):
+            self.generated += n
+            return generate_block(content_gen, n, start)
+
+        self.table._generate_block = count_rows
+        rows = list(self.table._generate_rows(0, 10))
+
+        self.assertEquals(10, self.generated)
+        self.assertEquals(rows[5:], list(self.table._generate_rows(5, 10)))
+
+
+class BrokenBlocksTable(SmallBlocksTable):
+    def _generate_blocks(self, start, stop):
+        for i, rows in enumerate(
+                super(BrokenBlocksTable, self)._generate_blocks(start, stop)):
+            if i == 2:
+                raise ValueError("Broken block")
+
+            yield rows
+
+
+class TestTablePipelined(SqliteDataBaseTestCase):
+    def setUp(self):
+        super(TestTablePipelined, self).setUp()
+
+        c = self.conn.cursor()
+        c.execute("drop table if exists events")
+        c.execute("create table events (value integer, name text)")
+        self.conn.commit()
+
+        self.table = SmallBlocksTable(
+            self._database, "events", ContentGen(seed=42)
+        )
+        self.stats = []
+        self.table.on_pipeline_stats.register(self.stats_callback)
+
+    def tearDown(self):
+        c = self.conn.cursor()
+        c.execute("drop table if exists events")
+        self.conn.commit()
+
+    def stats_callback(self, table_info, producer_wait, consumer_wait):
+        self.stats.append((table_info["name"], producer_wait, consumer_wait))
+
+    def get_rows(self):
+        c = self._database.get_cursor()
+        rows = c.execute("SELECT * from events").fetchall()
+        c.execute("DELETE from events")
+        self._database.get_conn().commit()
+        return rows
+
+    def test_fill_equals_serial_fill(self):
+        self.table.fill(n=550, batch_size=30)
+        self._database.get_conn().commit()
+        serial_rows = self.get_rows()
+        self.assertEquals([], self.stats)
+
+        self.table.fill(n=550, batch_size=30, queue_depth=2)
+        self.assertEquals(550, self.table.rows_done)
+        self.assertEquals(serial_rows, self.get_rows())
+
+        self.assertEquals(1, len(self.stats))
+        name, producer_wait, consumer_wait = self.stats[0]
+        self.assertEquals("events", name)
+        self.assertTrue(producer_wait >= 0 and consumer_wait >= 0)
+
+    def test_fill_abandoned_stops_generation(self):
+        c = self.conn.cursor()
+        c.execute("drop table if exists events")
+        c.execute("create table events (value integer check (value < 0))")
+        self.conn.commit()
+
+        threads = threading.active_count()
+        self.table.fill(n=5000, queue_depth=1, max_error_ratio=0.9,
+                        error_window=100)
+        self._database.get_conn().commit()
+
+        self.assertTrue(self.table.abandoned)
+        self.assertEquals(100, self.table.rows_done)
+        self.assertEquals(threads, threading.active_count())
+
+    def test_generation_error_is_raised(self):
+        self.table = BrokenBlocksTable(
+            self._database, "events", ContentGen(seed=42)
+        )
+
+        self.assertRaises(
+            ValueError, self.table.fill, n=550, queue_depth=2)
+        self._database.get_conn().rollback()
+
+
+class TestTableBatchErrors(SqliteDataBaseTestCase):
+    def setUp(self):
+        super(TestTableBatchErrors, self).setUp()
+
+        c = self.conn.cursor()
+        c.execute("drop table if exists checked")
+        c.execute("create table checked (value integer check (value < 5000))")
+        self.conn.commit()
+
+        self.table = Table(self._database, "checked", ContentGen())
+        self.table.on_insert_error.register(self.error_callback)
+        self.errors = 0
+
+    def tearDown(self):
+        c = self.conn.cursor()
+        c.execute("drop table if exists checked")
+        self.conn.commit()
+
+    def error_callback(self, e):
+        self.errors += 1
+
+    def test_fast_fill_counts_failed_rows(self):
+        self._database.fast = True
+        self.table.fill(n=100)
+        self._database.get_conn().commit()
+
+        c = self._database.get_cursor()
+        (inserted,) = c.execute("SELECT count(*) from checked").fetchone()
+
+        self.assertTrue(self.errors > 0)
+        self.assertEquals(100, inserted + self.errors)
+
+    def test_fast_fill_checks_breaker_between_batches(self):
+        self._database.fast = True
+        self.table.fast_batch_size = 100
+        self.commits = []
+        self.table.on_commit.register(self.commit_callback)
+
+        # Every row fails
+        self.table._get_fields()[0].min = 5000
+        self.table.fill(n=2000, commit_every=200, max_error_ratio=0.5,
+                        error_window=100)
+        self._database.get_conn().rollback()
+
+        self.assertTrue(self.table.abandoned)
+        self.assertEquals(100, self.errors)
+        self.assertEquals([], self.commits)
+
+    def commit_callback(self, table_info, rows):
+        self.commits.append(rows)
+
+    def test_fill_with_batch_size_counts_failed_rows(self):
+        self.table.fill(n=100, batch_size=30)
+        self._database.get_conn().commit()
+
+        c = self._database.get_cursor()
+        (inserted,) = c.execute("SELECT count(*) from checked").fetchone()
+
+        self.assertTrue(self.errors > 0)
+        self.assertEquals(100, inserted + self.errors)
+
+    def test_fill_reports_errors_with_rows_inserted(self):
+        self.reports = []
+        self.table.on_rows_inserted.register(self.rows_inserted_callback)
+
+        self.table.fill(n=100, batch_size=30)
+        self._database.get_conn().commit()
+
+        self.assertEquals(100, sum(count for count, _ in self.reports))
+        self.assertEquals(
+            self.errors, sum(errors for _, errors in self.reports)
+        )
+
+    def rows_inserted_callback(self, table_info, count, errors):
+        self.reports.append((count, errors))
@@ -1,6 +1,13 @@
 import unittest
 import loremdb.util
 from datetime import date, datetime
+from decimal import Decimal
+from random import Random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class test_content_gen(unittest.TestCase):
@@ -63,12 +70,236 @@ class test_content_gen(unittest.TestCase):
         for i in xrange(100):
             self.assertIn(self.i.get_in_list(list), list)
 
+    def test_spawn(self):
+        first = loremdb.util.ContentGen(Random(10)).spawn()
+        second = loremdb.util.ContentGen(Random(10)).spawn()
+
+        self.assertEquals(
+            [first.get_int(0, 1000) for i in xrange(10)],
+            [second.get_int(0, 1000) for i in xrange(10)]
+        )
+
+    def test_derive(self):
+        first = loremdb.util.ContentGen(seed=10).derive("users", 3)
+        second = loremdb.util.ContentGen(seed=10).derive("users", 3)
+        other = loremdb.util.ContentGen(seed=10).derive("users", 4)
+
+        values = [first.get_int(0, 1000) for i in xrange(10)]
+        self.assertEquals(
+            values, [second.get_int(0, 1000) for i in xrange(10)]
+        )
+
+        self.assertNotEquals(
+            values, [other.get_int(0, 1000) for i in xrange(10)]
+        )
+
+    def test_spawn_with_seed(self):
+        content_gen = loremdb.util.ContentGen(seed=10)
+        self.assertEquals(10, content_gen.spawn().seed)
+
     def test_get_list_subset(self):
         options = ["foo", "bar", "baz", "foobar"]
         for i in self.i.get_list_subset(options):
             self.assertIn(i, options)
 
 
+class test_content_gen_batches(unittest.TestCase):
+
+    def setUp(self):
+        self.i = self.create_content_gen()
+
+    def create_content_gen(self):
+        return loremdb.util.ContentGen(Random(10))
+
+    def test_get_ints(self):
+        values = self.i.get_ints(1, 5, 100)
+        self.assertEquals(100, len(values))
+        for i in values:
+            self.assertIn(i, range(1, 6))
+
+    def test_get_ints_with_big_range(self):
+        values = self.i.get_ints(0, 18446744073709551614, 100)
+        for i in values:
+            self.assertTrue(0 <= i <= 18446744073709551614)
+
+        values = self.i.get_ints(
+            -9223372036854775807, 9223372036854775807, 100
+        )
+        for i in values:
+            self.assertTrue(-9223372036854775807 <= i <= 9223372036854775807)
+
+    def test_get_ints_with_wider_range_than_64_bits(self):
+        end = 10 ** 22 - 1
+        values = self.i.get_ints(-end, end, 1000)
+        for i in values:
+            self.assertTrue(-end <= i <= end)
+
+        # Values are spread over the whole range
+        negatives = len([i for i in values if i < 0])
+        self.assertTrue(400 < negatives < 600)
+        big = len([i for i in values if abs(i) > end / 10])
+        self.assertTrue(big > 800)
+
+    def test_get_randoms(self):
+        for i in self.i.get_randoms(100):
+            self.assertTrue(0.0 <= i < 1.0)
+
+    def test_get_texts(self):
+        values = self.i.get_texts(20, 100)
+        self.assertEquals(100, len(values))
+        for text in values:
+            self.assertTrue(0 < len(text) <= 20)
+
+    def test_get_in_lists(self):
+        options = ["foo", "bar", "baz"]
+        for i in self.i.get_in_lists(options, 100):
+            self.assertIn(i, options)
+
+    def test_get_dates(self):
+        start = date(1990, 8, 28)
+        end = date(1990, 9, 28)
+        for rand_date in self.i.get_dates(100, start, end):
+            self.assertTrue(start <= rand_date <= end)
+
+    def test_get_datetimes(self):
+        start = datetime(1990, 8, 28, 12, 40, 20)
+        end = datetime(1990, 8, 28, 12, 50, 00)
+        for rand_datetime in self.i.get_datetimes(100, start, end):
+            self.assertTrue(start <= rand_datetime <= end)
+
+    def test_derive(self):
+        first = self.i.__class__(seed=1).derive("users", 0)
+        second = self.i.__class__(seed=1).derive("users", 0)
+
+        self.assertEquals(self.i.__class__, first.__class__)
+        self.assertEquals(
+            first.get_ints(0, 1000, 10), second.get_ints(0, 1000, 10)
+        )
+
+
+@unittest.skipIf(numpy is None, "NumPy isn't installed")
+class test_numpy_content_gen(test_content_gen_batches):
+
+    def create_content_gen(self):
+        return loremdb.util.NumpyContentGen(Random(10))
+
+    def test_vectorized(self):
+        self.assertTrue(self.i.vectorized)
+
+
+class test_counter_content_gen(test_content_gen_batches):
+
+    def create_content_gen(self):
+        return loremdb.util.CounterContentGen(seed=10)
+
+    def test_seek(self):
+        content_gen = self.i.derive("users")
+
+        content_gen.seek(100, 2)
+        first = content_gen.get_ints(0, 1000, 10)
+
+        content_gen.seek(5, 1)
+        content_gen.get_text(50)
+
+        content_gen.seek(100, 2)
+        self.assertEquals(first, content_gen.get_ints(0, 1000, 10))
+
+        content_gen.seek(100, 3)
+        self.assertNotEquals(first, content_gen.get_ints(0, 1000, 10))
+
+    def test_counter_random(self):
+        r = loremdb.util.CounterRandom(1)
+        for i in xrange(100):
+            self.assertTrue(0.0 <= r.random() < 1.0)
+            self.assertTrue(0 <= r.getrandbits(70) < 2 ** 70)
+
+        state = r.getstate()
+        numbers = [r.random() for i in xrange(10)]
+        r.setstate(state)
+        self.assertEquals(numbers, [r.random() for i in xrange(10)])
+
+
+class test_get_unique_text(unittest.TestCase):
+
+    def test_unique_text(self):
+        texts = [loremdb.util.get_unique_text(i, 8) for i in xrange(5000)]
+
+        self.assertEquals(5000, len(set(texts)))
+        for text in texts:
+            self.assertTrue(0 < len(text) <= 8)
+
+    def test_unique_text_length(self):
+        self.assertEquals("z", loremdb.util.get_unique_text(35, 1))
+        self.assertEquals("Lorem 0", loremdb.util.get_unique_text(0, 7))
+        self.assertTrue(
+            len(loremdb.util.get_unique_text(0, 1000)) <=
+            loremdb.util.max_text_len
+        )
+
+
+class test_date_tables(unittest.TestCase):
+
+    def test_get_date_table(self):
+        start, end = date(2012, 2, 28), date(2012, 3, 1)
+        dates = loremdb.util.get_date_table(start, end)
+
+        self.assertEquals(
+            [date(2012, 2, 28), date(2012, 2, 29), date(2012, 3, 1)], dates)
+        # Tables are built once for each pair of bounds
+        self.assertTrue(dates is loremdb.util.get_date_table(start, end))
+
+    def test_get_date_texts(self):
+        self.assertEquals(
+            ["2012-02-29 ", "2012-03-01 "],
+            loremdb.util.get_date_texts(date(2012, 2, 29), date(2012, 3, 1))
+        )
+
+    def test_get_time_texts(self):
+        times = loremdb.util.ContentGen().get_time_texts(1000)
+        for text in times:
+            self.assertEquals(8, len(text))
+            datetime.strptime(text, "%H:%M:%S")
+
+    def test_get_datetime_texts(self):
+        content_gen = loremdb.util.ContentGen()
+        start = datetime(1990, 8, 28, 23, 59, 50)
+        end = datetime(1990, 8, 29, 0, 0, 10)
+
+        texts = content_gen.get_datetime_texts(200, start, end)
+        generate = content_gen.get_datetime_text_function(start, end)
+        texts += [generate() for i in xrange(200)]
+        texts.append(content_gen.get_datetime_text(start, end))
+
+        for text in texts:
+            value = datetime.strptime(text, "%Y-%m-%d %H:%M:%S")
+            self.assertTrue(start <= value <= end)
+
+        self.assertEquals(21, len(set(texts)))
+
+
+class test_get_scaled_number(unittest.TestCase):
+
+    def test_decimal(self):
+        scaled = loremdb.util.get_scaled_number(2)
+        self.assertEquals(Decimal("-12.34"), scaled(-1234))
+        self.assertEquals("0.05", str(scaled(5)))
+        self.assertEquals("0.00", str(scaled(0)))
+
+    def test_without_scale(self):
+        self.assertEquals("123", str(loremdb.util.get_scaled_number(0)(123)))
+
+    def test_big_precision(self):
+        digits = "9" * 65
+        scaled = loremdb.util.get_scaled_number(30)
+        self.assertEquals(
+            digits[:35] + "." + digits[35:], str(scaled(int(digits))))
+
+    def test_float(self):
+        scaled = loremdb.util.get_scaled_number(3, as_float=True)
+        self.assertEquals(0.005, scaled(5))
+        self.assertEquals(-1.5, scaled(-1500))
+
+
 class testOptionsParser(unittest.TestCase):
 
     def setUp(self):